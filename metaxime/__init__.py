@@ -4,10 +4,8 @@ from .version import __version__
 #from .parser import ParserRP2
 #from .cache_data import RR_Data
 
-#make sure that RDKit does not have those warning messages
-from rdkit import RDLogger
-lg = RDLogger.logger()
-lg.setLevel(RDLogger.CRITICAL)   # only show critical messages
+# RDKit (and the other heavy dependencies) are imported on first use;
+# its warning messages are silenced then (see metaxime.utils.load_rdkit)
 
 import logging
 
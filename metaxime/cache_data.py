@@ -1,22 +1,178 @@
 from biopathopt import Data
-import compress_json
 import logging
-import requests
 import os
+import functools
+import hashlib
+import importlib.metadata
+import json
+import multiprocessing as mp
+
+from .service import ReferenceDataClient, REFERENCE_ATTRS
+from .fingerprints import FingerprintCache, FingerprintIndex, fp_to_text
+from .store import SQLiteStore, file_lock
+from .utils import read_compressed_tsv, resource_path
+
+RR_RECIPES_COLUMNS = [
+    "Reaction_ID", 
+    "Equation", 
+    "Description", 
+    "Direction", 
+    "EC_number", 
+    "Name", 
+    "Type", 
+    "UniProt_IDs",
+    "Additional_RIDs", 
+    "Main_left", 
+    "Main_right", 
+    "Secondary_left", 
+    "Secondary_right",
+]
+
+# Bumped whenever the layout of the derived caches changes
+CACHE_FORMAT_VERSION = 2
+
+# Morgan fingerprint parameters of the precomputed recipe structure pools
+STRC_POOL_RADIUS = 2
+STRC_POOL_N_BITS = 2048
+
+# RR_Data instance shared with the forked workers of the rr_recipes build
+_RR_BUILD_DATA = None
+
+
+@functools.lru_cache(maxsize=None)
+def cache_stamp():
+    """Return the stamp identifying the inputs of the derived caches
+
+    Returns:
+        dict: sha256 of the packaged rxn_recipes.tsv.tar.gz, the biopathopt version and the cache format
+    """
+    sha = hashlib.sha256()
+    with open(resource_path("data/rxn_recipes.tsv.tar.gz"), "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            sha.update(block)
+    try:
+        biopathopt_version = importlib.metadata.version("biopathopt")
+    except importlib.metadata.PackageNotFoundError:
+        biopathopt_version = "unknown"
+    return {
+        "rxn_recipes_sha256": sha.hexdigest(),
+        "biopathopt_version": biopathopt_version,
+        "cache_format": CACHE_FORMAT_VERSION,
+    }
+
+
+def cache_stamp_id():
+    """Return a short hash of ``cache_stamp``, part of the file names of the derived caches
+
+    Caches built from other inputs have other names, so they are never read, nor removed
+    from under a process still using them, and a warm cache is found without writing anything.
+
+    Returns:
+        str: The first 16 hex digits of the sha256 of the stamp
+    """
+    return hashlib.sha256(json.dumps(cache_stamp(), sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _reference_table(name):
+    """Property returning a biopathopt table from the reference-data service when connected
+
+    Without a service the table of ``Data`` is returned, whether it is a property or an
+    instance attribute of ``Data``.
+    """
+    def fget(self):
+        client = self.__dict__.get('_reference_client')
+        if client is not None:
+            return client.attr(name) if name in REFERENCE_ATTRS else client.table(name)
+        if name in self.__dict__:
+            return self.__dict__[name]
+        return getattr(super(RR_Data, self), name)
+
+    def fset(self, value):
+        self.__dict__[name] = value
+
+    return property(fget, fset, doc=f"{name} (served by the reference-data service when connected)")
+
+
+def _reference_method(name):
+    """Method calling the reference-data service when connected and ``Data`` otherwise"""
+    def method(self, *args, **kwargs):
+        client = self.__dict__.get('_reference_client')
+        if client is not None:
+            return client.call(name, *args, **kwargs)
+        return getattr(super(RR_Data, self), name)(*args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+def _rr_recipes_chunk(records):
+    """Complete a chunk of recipes in a forked worker (see ``RR_Data._iter_rr_recipes``)"""
+    return [(rid, _RR_BUILD_DATA._rr_recipe_entry(recipe)) for rid, recipe in records]
 
-from .utils import read_compressed_tsv
 
 class RR_Data(Data):
     def __init__(
             self, 
             use_progressbar=False, 
             low_memory_mode=False,
+            n_workers=1,
+            reference_socket=None,
         ):
         """Class that inherits Data used to build a cobra model
+
+        When a reference-data service (see ``metaxime serve``) answers on ``reference_socket``,
+        or on the socket of the ``METAXIME_REFERENCE_SOCKET`` environment variable, the
+        MetaNetX tables are looked up from it instead of being loaded in this process.
+        Pass ``reference_socket=False`` to always load them in process.
         """
+        self._reference_client = None if reference_socket is False else ReferenceDataClient.connect(reference_socket)
         super().__init__(low_memory_mode=low_memory_mode, use_progressbar=use_progressbar)
         #super().__init__()
+        self.n_workers = n_workers
         self._rr_recipes = None
+        self._mnxm_fp_index = None
+        self._retrorules_store = None
+        self._strc_pool_fps = FingerprintCache()
+        self._strc_pool_entries = {}
+
+    # MetaNetX tables and lookups that can be served by the reference-data service
+    mnxm_prop = _reference_table('mnxm_prop')
+    mnxr_prop = _reference_table('mnxr_prop')
+    inchikey_mnxm = _reference_table('inchikey_mnxm')
+    inchikey2_mnxm = _reference_table('inchikey2_mnxm')
+    mnxm_cofactors = _reference_table('mnxm_cofactors')
+    mnxm_xref = _reference_method('mnxm_xref')
+    single_depr_mnxm = _reference_method('single_depr_mnxm')
+    single_depr_mnxr = _reference_method('single_depr_mnxr')
+
+
+    def _cache_path(self, name):
+        """Return the path of a derived cache, stamped with the inputs it is built from
+
+        Args:
+            name (str): Name of the cache in the flatfiles directory, e.g. "rr_recipes.sqlite"
+        Returns:
+            str: ``<base_dir>/flatfiles/<stem>.<cache_stamp_id>.<extension>``
+        """
+        stem, _, ext = name.partition('.')
+        return os.path.join(self.base_dir, 'flatfiles', f"{stem}.{cache_stamp_id()}{'.' + ext if ext else ''}")
+
+
+    def warm_cache(self, fp_index=True):
+        """Build every derived cache ahead of time (e.g. at Docker build time)
+
+        Args:
+            fp_index (bool): Also build the MetaNetX fingerprint index
+        Returns:
+            None
+        """
+        logging.info("Building rr_recipes")
+        self.rr_recipes
+        logging.info("Building the RetroRules store")
+        self.retrorules_store
+        if fp_index:
+            logging.info("Building the MetaNetX fingerprint index")
+            self.mnxm_fp_index
 
     @property
     def rr_recipes(self):
@@ -25,60 +181,188 @@ class RR_Data(Data):
         This function will download the following file https://www.metanetx.org/cgi-bin/mnxget/mnxref/mnxr_prop.tsv that
         describes the chemical structure, etc...
 
+        The recipes are stored in an indexed SQLite file (``flatfiles/rr_recipes.<stamp>.sqlite``,
+        see ``_cache_path``) and only the recipes that are looked up are read from disk.
+        The lock is only taken to build it, so a warm cache can be read-only.
+
         Args:
         Returns:
-            dict: Reaction properties from MetaNetX
+            SQLiteStore: Reaction properties from MetaNetX, keyed by reaction ID (point lookups
+            with ``[]``/``get`` and bulk lookups with ``get_many``)
         """
-        if not self._rr_recipes:
+        if self._rr_recipes is None:
             logging.debug("------ rr_recipes -----")
             logging.debug("\t-> Populating...")
-            rr_recipes_path = os.path.join(self.base_dir, "flatfiles/rr_recipes.json.gz")
-            if not os.path.exists(rr_recipes_path):
-                rr_recipes = read_compressed_tsv('data/rxn_recipes.tsv.tar.gz')
-                rr_recipes.columns = [
-                    "Reaction_ID", 
-                    "Equation", 
-                    "Description", 
-                    "Direction", 
-                    "EC_number", 
-                    "Name", 
-                    "Type", 
-                    "UniProt_IDs",
-                    "Additional_RIDs", 
-                    "Main_left", 
-                    "Main_right", 
-                    "Secondary_left", 
-                    "Secondary_right",
-                ]
-                rr_recipes = rr_recipes.set_index("Reaction_ID")
-                rr_recipes = rr_recipes.transpose().to_dict()
-                for i in rr_recipes:
-                    try:
-                        rr_recipes[i]["EC_number"] = rr_recipes[i]["EC_number"].split(
-                            ","
-                        )
-                    except AttributeError:
-                        rr_recipes[i]["EC_number"] = []
-                ### generate the reaction based in inchikeys
-                for i in rr_recipes:
-                    try:
-                        rr_recipes[i]['inchikey2_equation'] = \
-                            self.convert_mnxr_equation(rr_recipes[i]['Equation'], inchikey_levels=2)
-                    except (ValueError, KeyError) as e:
-                        rr_recipes[i]['inchikey2_equation'] = ''
-                    try:
-                        rr_recipes[i]['inchikey_equation'] = \
-                            self.convert_mnxr_equation(rr_recipes[i]['Equation'], inchikey_levels=3)
-                    except (ValueError, KeyError) as e:
-                        rr_recipes[i]['inchikey_equation'] = ''
-                ### generate main left and main right
-                for i in rr_recipes:
-                    reactants, products = self.parse_mnxr_equation(rr_recipes[i]['Equation'])
-                    rr_recipes[i]['main_reactants'] = {y[1]: y[0] for y in reactants if y[1] not in self.mnxm_cofactors}
-                    rr_recipes[i]['secondary_reactants'] = {y[1]: y[0] for y in reactants if y[1] in self.mnxm_cofactors}
-                    rr_recipes[i]['main_products'] = {y[1]: y[0] for y in products if y[1] not in self.mnxm_cofactors}
-                    rr_recipes[i]['secondary_products'] = {y[1]: y[0] for y in products if y[1]  in self.mnxm_cofactors}
-                #save it
-                compress_json.dump(rr_recipes, rr_recipes_path)
-            self._rr_recipes = compress_json.load(rr_recipes_path)
+            rr_recipes_store_path = self._cache_path("rr_recipes.sqlite")
+            if not SQLiteStore.exists(rr_recipes_store_path):
+                with file_lock(rr_recipes_store_path):
+                    if not SQLiteStore.exists(rr_recipes_store_path):
+                        SQLiteStore.build(rr_recipes_store_path, self._iter_rr_recipes())
+            self._rr_recipes = SQLiteStore(rr_recipes_store_path)
         return self._rr_recipes
+
+
+    def _rr_recipe_entry(self, recipe):
+        """Complete a single recipe with its inchikey equations and main/secondary species
+
+        Args:
+            recipe (dict): Row of rxn_recipes.tsv, EC_number already split into a list
+        Returns:
+            dict: The completed recipe
+        """
+        ### generate the reaction based in inchikeys
+        try:
+            recipe['inchikey2_equation'] = self.convert_mnxr_equation(recipe['Equation'], inchikey_levels=2)
+        except (ValueError, KeyError) as e:
+            recipe['inchikey2_equation'] = ''
+        try:
+            recipe['inchikey_equation'] = self.convert_mnxr_equation(recipe['Equation'], inchikey_levels=3)
+        except (ValueError, KeyError) as e:
+            recipe['inchikey_equation'] = ''
+        ### generate main left and main right
+        reactants, products = self.parse_mnxr_equation(recipe['Equation'])
+        recipe['main_reactants'] = {y[1]: y[0] for y in reactants if y[1] not in self.mnxm_cofactors}
+        recipe['secondary_reactants'] = {y[1]: y[0] for y in reactants if y[1] in self.mnxm_cofactors}
+        recipe['main_products'] = {y[1]: y[0] for y in products if y[1] not in self.mnxm_cofactors}
+        recipe['secondary_products'] = {y[1]: y[0] for y in products if y[1]  in self.mnxm_cofactors}
+        ### resolved structure and fingerprint of every species
+        recipe['strc_pool'] = {}
+        for y in reactants + products:
+            entry = self._strc_pool_entry(y[1])
+            if entry is not None:
+                recipe['strc_pool'][y[1]] = entry
+        return recipe
+
+
+    def _strc_pool_entry(self, mnxm):
+        """Return the structure of a MetaNetX compound and its serialized fingerprint
+
+        The InChI is used, or the SMILES when there is no InChI. Entries are memoized
+        for the duration of the rr_recipes build.
+
+        Args:
+            mnxm (str): The MetaNetX compound ID
+        Returns:
+            list: [structure, fingerprint] (see ``fp_to_text``), the fingerprint being None
+            for an unparsable structure, or None if the compound has no structure
+        """
+        if mnxm not in self._strc_pool_entries:
+            entry = None
+            prop = self.mnxm_prop.get(mnxm, {})
+            for strc in (prop.get('InChI'), prop.get('SMILES')):
+                if isinstance(strc, str) and strc:
+                    fp = self._strc_pool_fps.compute(strc, radius=STRC_POOL_RADIUS, n_bits=STRC_POOL_N_BITS)
+                    entry = [strc, fp_to_text(fp)]
+                    break
+            self._strc_pool_entries[mnxm] = entry
+        return self._strc_pool_entries[mnxm]
+
+
+    def _iter_rr_recipes(self, chunk_size=2000):
+        """Stream rxn_recipes.tsv and yield the completed recipes in a single pass
+
+        The recipes are read and completed in chunks. With ``n_workers`` > 1 the chunks are
+        spread over forked worker processes, which share the MetaNetX tables of this
+        instance copy-on-write; the first chunk is always completed in this process
+        so that those tables are loaded before forking. The order of the file is kept.
+
+        Args:
+            chunk_size (int): Number of recipes per chunk
+        Yields:
+            tuple: (Reaction_ID, recipe)
+        """
+        global _RR_BUILD_DATA
+        chunks = (
+            self._rr_recipes_records(chunk)
+            for chunk in read_compressed_tsv(
+                resource_path('data/rxn_recipes.tsv.tar.gz'),
+                chunksize=chunk_size,
+                names=RR_RECIPES_COLUMNS,
+            )
+        )
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            return
+        yield from ((rid, self._rr_recipe_entry(recipe)) for rid, recipe in first_chunk)
+        if self.n_workers > 1 and "fork" in mp.get_all_start_methods():
+            _RR_BUILD_DATA = self
+            try:
+                with mp.get_context("fork").Pool(self.n_workers) as pool:
+                    for completed in pool.imap(_rr_recipes_chunk, chunks):
+                        yield from completed
+            finally:
+                _RR_BUILD_DATA = None
+        else:
+            for chunk in chunks:
+                yield from ((rid, self._rr_recipe_entry(recipe)) for rid, recipe in chunk)
+        self._strc_pool_entries = {}
+
+
+    @staticmethod
+    def _rr_recipes_records(rr_recipes):
+        """Convert a chunk of rxn_recipes.tsv to (Reaction_ID, recipe) records, splitting the EC numbers"""
+        rr_recipes["EC_number"] = [i.split(",") if isinstance(i, str) else [] for i in rr_recipes["EC_number"]]
+        return [(recipe.pop("Reaction_ID"), recipe) for recipe in rr_recipes.to_dict("records")]
+
+
+    @property
+    def mnxm_fp_index(self):
+        """Return the memory-mapped fingerprint index of the MetaNetX compounds
+
+        The index is built from the InChI (or SMILES when there is no InChI) of every
+        compound in ``mnxm_prop`` and stored in the flatfiles directory (see ``_cache_path``).
+
+        Args:
+        Returns:
+            FingerprintIndex: Index of Morgan fingerprints keyed by MNXM
+        """
+        if self._mnxm_fp_index is None:
+            logging.debug("------ mnxm_fp_index -----")
+            logging.debug("\t-> Populating...")
+            index_prefix = self._cache_path("mnxm_fp_index")
+            if not FingerprintIndex.exists(index_prefix):
+                with file_lock(index_prefix):
+                    if not FingerprintIndex.exists(index_prefix):
+                        strc_dict = {}
+                        for mnxm, prop in self.mnxm_prop.items():
+                            for strc in (prop.get('InChI'), prop.get('SMILES')):
+                                if isinstance(strc, str) and strc:
+                                    strc_dict[mnxm] = strc
+                                    break
+                        FingerprintIndex.build(strc_dict, index_prefix, use_progressbar=self.use_progressbar)
+            self._mnxm_fp_index = FingerprintIndex(index_prefix)
+        return self._mnxm_fp_index
+
+
+    @property
+    def retrorules_store(self):
+        """Return the on-disk keyed store of the RetroRules properties
+
+        The store is built once from ``retrorules_prop``; afterwards the rules are read
+        from disk on demand and the full RetroRules table is never loaded again.
+
+        Args:
+        Returns:
+            SQLiteStore: RetroRules properties keyed by rule ID
+        """
+        if self._retrorules_store is None:
+            logging.debug("------ retrorules_store -----")
+            logging.debug("\t-> Populating...")
+            store_path = self._cache_path("retrorules_prop.sqlite")
+            if not SQLiteStore.exists(store_path):
+                with file_lock(store_path):
+                    if not SQLiteStore.exists(store_path):
+                        SQLiteStore.build(store_path, self.retrorules_prop.items())
+            self._retrorules_store = SQLiteStore(store_path)
+        return self._retrorules_store
+
+
+    def get_retrorules(self, rule_ids):
+        """Return the RetroRules properties of the given rules only
+
+        Args:
+            rule_ids (Iterable[str]): The rule IDs to fetch
+        Returns:
+            dict: Rule ID -> properties (as in ``retrorules_prop``) for the rules that are found
+        """
+        return self.retrorules_store.get_many(rule_ids)
@@ -0,0 +1,54 @@
+import argparse
+import logging
+
+
+def build_cli():
+    parser = argparse.ArgumentParser(
+        prog="metaxime",
+        description="MetaXime command line tools",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    warm_cache = subparsers.add_parser(
+        "warm-cache",
+        help="Build every derived cache (rr_recipes, RetroRules store, fingerprint index) ahead of time",
+    )
+    warm_cache.add_argument("--n_workers", type=int, default=1, help="Number of processes used to build rr_recipes")
+    warm_cache.add_argument("--skip_fp_index", action="store_true", help="Do not build the MetaNetX fingerprint index")
+    warm_cache.add_argument("--use_progressbar", action="store_true", help="Show progress bars")
+
+    serve = subparsers.add_parser(
+        "serve",
+        help="Hold the MetaNetX reference data in memory and serve it to the pipeline runs over a UNIX socket",
+    )
+    serve.add_argument("--socket", required=True, help="Path of the UNIX socket (set METAXIME_REFERENCE_SOCKET to it in the clients)")
+    serve.add_argument("--use_progressbar", action="store_true", help="Show progress bars")
+
+    return parser
+
+
+def warm_cache(args):
+    from metaxime.cache_data import RR_Data
+
+    data = RR_Data(use_progressbar=args.use_progressbar, n_workers=args.n_workers)
+    data.warm_cache(fp_index=not args.skip_fp_index)
+    logging.info("Cache ready in %s", data.base_dir)
+
+
+def serve(args):
+    from metaxime.service import serve as serve_reference_data
+
+    serve_reference_data(args.socket, use_progressbar=args.use_progressbar)
+
+
+def main(argv=None):
+    args = build_cli().parse_args(argv)
+    logging.getLogger().setLevel(logging.INFO)
+    if args.command == "warm-cache":
+        warm_cache(args)
+    elif args.command == "serve":
+        serve(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Dict, Tuple, Any, Optional, List, Sequence, Mapping, TYPE_CHECKING
+
+import base64
+import heapq
+import logging
+import os
+import compress_json
+import numpy as np
+
+from .utils import load_rdkit
+
+# RDKit is imported on first use (see ``load_rdkit``)
+if TYPE_CHECKING:
+    from rdkit import Chem
+
+# number of set bits of every byte (np.bitwise_count needs NumPy 2)
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+# extensions of the files of a FingerprintIndex, the metadata last since it is written last
+_INDEX_FILES = ('.fps.npy', '.popcount.npy', '.json.gz')
+
+
+def _popcount(packed: np.ndarray) -> np.ndarray:
+    """Return the number of set bits of bit-packed fingerprints, along the last axis"""
+    return _POPCOUNT[packed].sum(axis=-1, dtype=np.int32)
+
+
+def _morgan_generator(radius: int, n_bits: int):
+    from rdkit.Chem import rdFingerprintGenerator
+    return rdFingerprintGenerator.GetMorganGenerator(radius=radius, fpSize=n_bits)
+
+
+def mol_from_strc(strc: str) -> Optional[Chem.Mol]:
+    """Parse an InChI or SMILES string into an RDKit molecule.
+
+    Args:
+        strc: Structure string. Treated as InChI if it starts with "InChI=", SMILES otherwise.
+
+    Returns:
+        Optional[Chem.Mol]: The parsed molecule, or None if it cannot be parsed.
+    """
+    Chem = load_rdkit()
+    try:
+        if strc.strip().startswith("InChI="):
+            return Chem.MolFromInchi(strc)
+        return Chem.MolFromSmiles(strc)
+    except TypeError:
+        logging.warning(f'ArgumentError for MolFromInchi or MolFromSmiles for {strc}')
+        return None
+
+
+class FingerprintCache:
+    def __init__(self, maxsize: int = 50000):
+        """Bounded LRU cache of Morgan fingerprints keyed by (structure, radius, n_bits)
+
+        Structures that cannot be parsed are cached as None so that they are
+        not re-parsed on every lookup.
+
+        Args:
+            maxsize: Maximum number of fingerprints to keep. Least recently used entries are evicted first.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._fps: "OrderedDict[Tuple[str, int, int], Any]" = OrderedDict()
+        self._generators: Dict[Tuple[int, int], Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._fps)
+
+    def generator(self, radius: int = 2, n_bits: int = 2048):
+        """Return the (shared) Morgan fingerprint generator for the given parameters"""
+        key = (radius, n_bits)
+        if key not in self._generators:
+            self._generators[key] = _morgan_generator(radius, n_bits)
+        return self._generators[key]
+
+    def compute(self, strc: str, radius: int = 2, n_bits: int = 2048):
+        """Compute the Morgan fingerprint of a structure without using the cache
+
+        Returns:
+            ExplicitBitVect or None if the structure cannot be parsed.
+        """
+        mol = mol_from_strc(strc)
+        return self.generator(radius, n_bits).GetFingerprint(mol) if mol is not None else None
+
+    def get(self, strc: str, radius: int = 2, n_bits: int = 2048):
+        """Return the Morgan fingerprint of a structure, computing it on a miss.
+
+        Args:
+            strc: InChI or SMILES string.
+            radius: Morgan fingerprint radius.
+            n_bits: Fingerprint size.
+
+        Returns:
+            ExplicitBitVect or None if the structure cannot be parsed.
+        """
+        key = (strc, radius, n_bits)
+        try:
+            fp = self._fps[key]
+            self._fps.move_to_end(key)
+            self.hits += 1
+            return fp
+        except KeyError:
+            pass
+        self.misses += 1
+        fp = self.compute(strc, radius=radius, n_bits=n_bits)
+        self._fps[key] = fp
+        if len(self._fps) > self.maxsize:
+            self._fps.popitem(last=False)
+        return fp
+
+    def put(self, strc: str, fp, radius: int = 2, n_bits: int = 2048) -> None:
+        """Seed the cache with a precomputed fingerprint (or None for an invalid structure)"""
+        self._fps[(strc, radius, n_bits)] = fp
+        self._fps.move_to_end((strc, radius, n_bits))
+        if len(self._fps) > self.maxsize:
+            self._fps.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit/miss counters and the current size of the cache"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._fps)}
+
+    def clear(self) -> None:
+        """Empty the cache and reset the counters"""
+        self._fps.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def fp_to_text(fp) -> Optional[str]:
+    """Serialize a fingerprint to a JSON friendly string (None is kept as None)"""
+    if fp is None:
+        return None
+    from rdkit.DataStructs import BitVectToBinaryText
+    return base64.b64encode(BitVectToBinaryText(fp)).decode('ascii')
+
+
+def fp_from_text(text: Optional[str]):
+    """Inverse of ``fp_to_text``"""
+    if text is None:
+        return None
+    from rdkit.DataStructs import CreateFromBinaryText
+    return CreateFromBinaryText(base64.b64decode(text))
+
+
+def bulk_tanimoto_topk(
+    query_fp,
+    keys: Sequence[str],
+    fps: Sequence[Any],
+    top_k: int = 1,
+) -> Tuple[List[Tuple[str, float]], float]:
+    """Score a query fingerprint against a pool in one call and return the best hits.
+
+    Ties are resolved in favour of the key that comes first in ``keys``.
+
+    Args:
+        query_fp: Fingerprint of the query molecule.
+        keys: Identifiers of the candidate fingerprints (same order as ``fps``).
+        fps: Candidate fingerprints.
+        top_k: Number of hits to return.
+
+    Returns:
+        Tuple[List[Tuple[str, float]], float]: The top-k (key, Tanimoto score) pairs in decreasing
+        order of score and the margin between the first and second hit (the first score if there
+        is only one candidate, 0.0 if there are none).
+    """
+    if not fps:
+        return [], 0.0
+    from rdkit.DataStructs import BulkTanimotoSimilarity
+    scores = BulkTanimotoSimilarity(query_fp, list(fps))
+    best = heapq.nlargest(max(top_k, 2), range(len(scores)), key=scores.__getitem__)
+    hits = [(keys[i], scores[i]) for i in best]
+    margin = hits[0][1] - hits[1][1] if len(hits) > 1 else hits[0][1]
+    return hits[:top_k], margin
+
+
+class FingerprintIndex:
+    def __init__(self, prefix: str):
+        """Memory-mapped index of bit-packed Morgan fingerprints
+
+        The index is made of three files sharing the same prefix:
+            - ``<prefix>.fps.npy``: (N, n_bits/8) uint8 packed fingerprints, sorted by popcount
+            - ``<prefix>.popcount.npy``: (N,) popcount of each fingerprint
+            - ``<prefix>.json.gz``: the keys (same order) and the fingerprint parameters
+
+        The fingerprints are never loaded in memory as a whole; queries only touch the
+        rows whose popcount can reach the requested Tanimoto threshold.
+
+        Args:
+            prefix: Path prefix of the index files (see ``FingerprintIndex.build``).
+        """
+        meta = compress_json.load(f'{prefix}.json.gz')
+        self.keys: List[str] = meta['keys']
+        self.radius: int = meta['radius']
+        self.n_bits: int = meta['n_bits']
+        self.fps = np.load(f'{prefix}.fps.npy', mmap_mode='r')
+        self.popcount = np.load(f'{prefix}.popcount.npy', mmap_mode='r')
+        self._gen = _morgan_generator(self.radius, self.n_bits)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def exists(prefix: str) -> bool:
+        """Return True if all the files of the index are present"""
+        return all(os.path.exists(f'{prefix}{ext}') for ext in _INDEX_FILES)
+
+    @classmethod
+    def build(
+        cls,
+        strc_dict: Mapping[str, Any],
+        prefix: str,
+        radius: int = 2,
+        n_bits: int = 2048,
+        use_progressbar: bool = False,
+    ) -> "FingerprintIndex":
+        """Fingerprint every structure of a dictionary and write the index to disk.
+
+        The files are written under temporary names and then renamed, the metadata last, so
+        that an interrupted build never leaves an index that looks complete.
+
+        Args:
+            strc_dict: Mapping of identifiers to InChI or SMILES strings. Missing or invalid structures are skipped.
+            prefix: Path prefix of the index files.
+            radius: Morgan fingerprint radius.
+            n_bits: Fingerprint size. Must be a multiple of 8.
+            use_progressbar: Show a progress bar while fingerprinting.
+
+        Returns:
+            FingerprintIndex: The memory-mapped index.
+        """
+        gen = _morgan_generator(radius, n_bits)
+        keys: List[str] = []
+        rows: List[np.ndarray] = []
+        from tqdm import tqdm
+        iterator = tqdm(strc_dict.items(), desc='Building fingerprint index') if use_progressbar else strc_dict.items()
+        for key, strc in iterator:
+            if not isinstance(strc, str) or not strc:
+                continue
+            mol = mol_from_strc(strc)
+            if mol is None:
+                continue
+            keys.append(key)
+            rows.append(np.packbits(gen.GetFingerprintAsNumPy(mol)))
+        fps = np.vstack(rows) if rows else np.zeros((0, n_bits // 8), dtype=np.uint8)
+        popcount = _popcount(fps)
+        order = np.argsort(popcount, kind='stable')
+        tmp_prefix = f'{prefix}.{os.getpid()}.tmp'
+        np.save(f'{tmp_prefix}.fps.npy', fps[order])
+        np.save(f'{tmp_prefix}.popcount.npy', popcount[order])
+        compress_json.dump(
+            {'radius': radius, 'n_bits': n_bits, 'keys': [keys[i] for i in order]},
+            f'{tmp_prefix}.json.gz',
+        )
+        for ext in _INDEX_FILES:
+            os.replace(f'{tmp_prefix}{ext}', f'{prefix}{ext}')
+        logging.debug(f'Wrote fingerprint index of {len(keys)} structures to {prefix}')
+        return cls(prefix)
+
+    def query(
+        self,
+        strc: str,
+        threshold: float = 0.8,
+        top_k: int = 1,
+        chunk_size: int = 65536,
+    ) -> List[Tuple[str, float]]:
+        """Return the nearest neighbours of a structure in the index.
+
+        Candidates are pruned with the popcount bound of the Tanimoto similarity,
+        ``min(a, b) / max(a, b)``, before their intersection is computed.
+
+        Args:
+            strc: InChI or SMILES of the query.
+            threshold: Minimum Tanimoto similarity of the returned hits.
+            top_k: Maximum number of hits to return.
+            chunk_size: Number of rows of the memory-mapped array scored at once.
+
+        Returns:
+            List[Tuple[str, float]]: (key, Tanimoto score) pairs in decreasing order of score.
+        """
+        mol = mol_from_strc(strc)
+        if mol is None:
+            logging.warning(f'Invalid query structure: {strc}')
+            return []
+        query = np.packbits(self._gen.GetFingerprintAsNumPy(mol))
+        q_count = int(_popcount(query))
+        if q_count == 0:
+            return []
+        lo = int(np.searchsorted(self.popcount, np.ceil(q_count * threshold), side='left'))
+        hi = int(np.searchsorted(self.popcount, np.floor(q_count / threshold), side='right')) if threshold > 0 else len(self.popcount)
+        hits: List[Tuple[float, int]] = []
+        for start in range(lo, hi, chunk_size):
+            stop = min(start + chunk_size, hi)
+            common = _popcount(self.fps[start:stop] & query)
+            scores = common / (q_count + self.popcount[start:stop] - common)
+            for i in np.flatnonzero(scores >= threshold):
+                hits.append((float(scores[i]), start + int(i)))
+        hits = heapq.nlargest(top_k, hits, key=lambda x: (x[0], -x[1]))
+        return [(self.keys[i], score) for score, i in hits]
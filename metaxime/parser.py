@@ -1,27 +1,51 @@
 from __future__ import annotations
 
-import copy
+import heapq
+import itertools
 import logging
-import pandas as pd
-import numpy as np
+import math
+import multiprocessing as mp
 import re
-import networkx as nx
-from tqdm import tqdm
+import time
 
-from typing import Dict, Tuple, Any, Optional, Iterable, Literal, Set, Union, List
-from typing import Callable, Dict, Any, Mapping, Optional
+from typing import Dict, Tuple, Any, Optional, Iterable, Iterator, Literal, Mapping, Set, Union, List, TYPE_CHECKING
 
-from cobra import Model, Reaction, Metabolite
-import cobra
+from metaxime.cache_data import RR_Data, STRC_POOL_RADIUS, STRC_POOL_N_BITS
+from metaxime.fingerprints import FingerprintCache, bulk_tanimoto_topk, fp_from_text
+from metaxime.steps import Step, CompletedStep, intern_stoichiometry
+from metaxime.tables import rp_paths_to_table, rp_paths_from_table, completed_paths_to_table, completed_paths_from_table
+from metaxime.utils import convert_depictions
 
-from rdkit import Chem
-from rdkit.Chem import rdFingerprintGenerator
-from rdkit.DataStructs import TanimotoSimilarity
+from biopathopt.utils import merge_annot_dicts
 
-from metaxime.cache_data import RR_Data
-from metaxime.utils import convert_depiction
+# pandas, networkx, cobra and tqdm are imported on first use, since only some of the methods need them
+if TYPE_CHECKING:
+    import cobra
+    import networkx as nx
+    import pandas as pd
+    from cobra import Model
+
+# ParserRP2 instance and subpaths shared with the forked workers of _process_all_paths
+_COMPLETION_DATA = None
+
+
+def _complete_path_worker(rp_path_num):
+    """Complete the subpaths of one Path ID in a forked worker (see ``ParserRP2._process_all_paths``)
+
+    Returns the completed subpaths with the matching statistics gathered while completing them,
+    since the statistics of the worker's copy of the parser are not seen by the parent.
+    """
+    parser, all_paths, rp_paths, match_threshold = _COMPLETION_DATA
+    parser.inchikey_match_stats = dict.fromkeys(parser.inchikey_match_stats, 0)
+    parser.step_memo_stats = dict.fromkeys(parser.step_memo_stats, 0)
+    completed = parser._complete_subpaths(
+        rp_path_num,
+        all_paths[rp_path_num],
+        rp_path=rp_paths.get(rp_path_num, {}),
+        match_threshold=match_threshold,
+    )
+    return rp_path_num, completed, parser.inchikey_match_stats, parser.step_memo_stats
 
-from biopathopt.utils import merge_annot_dicts
 
 """
 TODO: seperate each pathway as its own class and move the graph and other
@@ -37,15 +61,125 @@ class ParserRP2(RR_Data):
             use_progressbar=False, 
             low_memory_mode=False,
             match_strc_search_threshold: float = 0.8,
+            fp_cache_size: int = 50000,
+            strc_index_threshold: Optional[float] = None,
+            n_workers: int = 1,
+            stream_paths: bool = False,
+            reference_socket: Optional[str] = None,
+            max_subpaths: Optional[int] = None,
+            top_k_subpaths: Optional[int] = None,
+            subpath_time_budget: Optional[float] = None,
+            memoize_steps: bool = True,
+            prune_steps: bool = True,
+            scope_reaction_smiles: bool = True,
         ):
         """Class that inherits Data used to build a cobra model
+
+        With ``stream_paths``, out_paths.csv is not loaded at construction time
+        and ``rp_paths``, ``all_paths`` and ``completed_paths`` are left empty;
+        the completed pathways are then produced one Path ID at a time by
+        ``iter_completed_paths`` (or ``iter_rp2_models``).
+
+        The MetaNetX tables are served by the reference-data service listening on
+        ``reference_socket`` (or ``METAXIME_REFERENCE_SOCKET``) when there is one, and
+        loaded in process otherwise (see ``RR_Data``).
+
+        Pathways whose rule/reaction/substrate choices combine into more than
+        ``max_subpaths`` subpaths are skipped (see ``count_subpaths``).
+
+        With ``top_k_subpaths``, only the K subpaths of each pathway with the highest
+        combined rule score are enumerated, best first (see ``iter_best_subpaths``),
+        and ``max_subpaths`` is not used. With ``subpath_time_budget``, the completion
+        of the subpaths of a pathway stops once it has taken that many seconds.
+
+        With ``memoize_steps``, a step shared by several subpaths of a pathway is
+        completed once (see ``_complete_step``). With ``prune_steps``, the
+        (rule, reaction, substrate) choices that cannot be completed are removed
+        before the subpaths are enumerated (see ``_prune_infeasible_steps``).
+
+        With ``n_workers`` > 1, the Path IDs are also completed in parallel (see
+        ``_process_all_paths``).
+
+        Without ``scope_reaction_smiles``, the reaction SMILES of out_scope.csv are not
+        parsed and ``rp_scope`` only holds the scores and EC numbers (see ``_read_rp2scope``).
         """
-        super().__init__(low_memory_mode=low_memory_mode, use_progressbar=use_progressbar)
+        super().__init__(
+            low_memory_mode=low_memory_mode,
+            use_progressbar=use_progressbar,
+            n_workers=n_workers,
+            reference_socket=reference_socket,
+        )
+        self.fp_cache = FingerprintCache(maxsize=fp_cache_size)
+        self.strc_index_threshold = strc_index_threshold
+        self._recipe_inchikey_index: Dict[str, Dict[str, Dict[str, Optional[str]]]] = {}
+        self._recipe_strc_pools: Dict[str, Tuple[Dict[str, Dict[str, str]], List[str]]] = {}
+        self.inchikey_match_stats = {'exact': 0, 'fingerprint': 0}
+        self.memoize_steps = memoize_steps
+        self.step_memo_stats = {'hits': 0, 'misses': 0}
+        self.prune_steps = prune_steps
+        self._step_targets: Dict[Tuple[str, Tuple[str, ...], float], Tuple] = {}
+        self._infeasible_steps: Dict[Tuple[str, Tuple[str, ...], float], str] = {}
+        self.pruned_stats = {'steps': 0, 'subpaths': 0}
         self.rp_strc = self._read_rp2cmp(rp2_cmp_path)
-        self.rp_scope = self._read_rp2scope(rp2_scope_path)
-        self.rp_paths = self._read_rp2paths(rp2_paths_path)
-        self.all_paths = self._extract_all_paths(self.rp_paths)
-        self.completed_paths = self._process_all_paths(self.all_paths, match_threshold=match_strc_search_threshold)
+        self.rp_scope = self._read_rp2scope(rp2_scope_path, reaction_smiles=scope_reaction_smiles)
+        self.rp2_paths_path = rp2_paths_path
+        self.match_strc_search_threshold = match_strc_search_threshold
+        self.max_subpaths = max_subpaths
+        self.top_k_subpaths = top_k_subpaths
+        self.subpath_time_budget = subpath_time_budget
+        if stream_paths:
+            self.rp_paths = {}
+            self.all_paths = {}
+            self.completed_paths = {}
+        else:
+            self.rp_paths = self._read_rp2paths(rp2_paths_path)
+            self.all_paths = self._extract_all_paths(self.rp_paths, match_threshold=match_strc_search_threshold)
+            self.completed_paths = self._process_all_paths(self.all_paths, match_threshold=match_strc_search_threshold)
+            self._log_match_stats()
+
+
+    def _top_strc_matches(
+        self,
+        strc_query: str,
+        strc_dict: Dict[str, str],
+        top_k: int = 2,
+        radius: int = 2,
+        n_bits: int = 2048,
+    ) -> Tuple[List[Tuple[str, float]], float]:
+        """Score a query structure against a whole pool of structures in one call.
+
+        Fingerprints come from ``self.fp_cache`` and the similarities are computed with
+        RDKit's bulk Tanimoto similarity.
+
+        Args:
+            strc_query (str): The query molecule structure (InChI or SMILES).
+            strc_dict (Dict[str, str]): Dictionary with keys as identifiers and values as InChIs or SMILES.
+            top_k (int): Number of hits to return. Defaults to 2.
+            radius (int): Morgan fingerprint radius. Defaults to 2.
+            n_bits (int): Fingerprint size. Defaults to 2048.
+
+        Returns:
+            Tuple[List[Tuple[str, float]], float]: The top-k (key, Tanimoto score) pairs in decreasing
+            order of score, and the margin between the first and second hit. Returns ([], 0.0) if the
+            query or all the candidates are invalid.
+        """
+        import pandas as pd
+
+        if pd.isna(strc_query) or str(strc_query).lower() in ('nan', '', 'null', 'none'):
+            return [], 0.0
+        query_fp = self.fp_cache.get(strc_query, radius=radius, n_bits=n_bits)
+        if query_fp is None:
+            logging.error(f"Invalid query InChI: {strc_query}")
+            return [], 0.0
+        keys, fps = [], []
+        for key, strc in strc_dict.items():
+            fp = self.fp_cache.get(strc, radius=radius, n_bits=n_bits)
+            if fp is None:
+                logging.warning(f"Invalid input structure for {key}: {strc}")
+                continue
+            keys.append(key)
+            fps.append(fp)
+        return bulk_tanimoto_topk(query_fp, keys, fps, top_k=top_k)
 
 
     def _best_strc_match(
@@ -61,39 +195,158 @@ class ParserRP2(RR_Data):
             query_inchi (str): The query molecule structure.
             inchi_dict (Dict[str, str]): Dictionary with keys as identifiers and values as InChIs.
             radius (int): Morgan fingerprint radius. Defaults to 2.
-            threshold (float): Minimum similarity threshold for a confident match. Defaults to 0.7.
 
         Returns:
             Tuple[Optional[str], float]: (Best matching key, Tanimoto score). Returns (None, 0.0) if no confident match found.
         """
-        if pd.isna(strc_query) or str(strc_query).lower() in ('nan', '', 'null', 'none'):
+        hits, _ = self._top_strc_matches(strc_query, strc_dict, top_k=1, radius=radius, n_bits=n_bits)
+        if not hits:
             return None, 0.0
-        gen = rdFingerprintGenerator.GetMorganGenerator(radius=radius,fpSize=n_bits)
-        if strc_query.strip().startswith("InChI="):
-            query_mol = Chem.MolFromInchi(strc_query)
-        else:
-            query_mol = Chem.MolFromSmiles(strc_query)
-        if query_mol is None:
-            logging.error(f"Invalid query InChI: {strc_query}")
-            return None, 0.0
-        query_fp = gen.GetFingerprint(query_mol)
-        best_key, best_score = None, -1.0
-        for key, strc in strc_dict.items():
-            try:
-                if strc.strip().startswith("InChI="):
-                    mol = Chem.MolFromInchi(strc)
-                else:
-                    mol = Chem.MolFromSmiles(strc)
-            except TypeError:
-                logging.warning(f'ArgumentError for MolFromInchi or MolFromSmiles for {strc}')
-                continue
-            if mol is None:
-                logging.warning(f"Invalid input structure for {key}: {strc}")
-                continue
-            sim = TanimotoSimilarity(query_fp, gen.GetFingerprint(mol))
-            if sim > best_score:
-                best_key, best_score = key, sim
-        return best_key, best_score
+        return hits[0]
+
+
+    def _strc_index_mnxm(self, strc: Optional[str]) -> Optional[str]:
+        """Resolve a structure to a MNXM using the global fingerprint index.
+
+        Only used when ``strc_index_threshold`` is set, since the first call
+        builds the index over all of ``mnxm_prop`` if it is not on disk yet.
+
+        Args:
+            strc (Optional[str]): InChI or SMILES of the compound.
+
+        Returns:
+            Optional[str]: The closest MNXM with a Tanimoto score above the threshold, None otherwise.
+        """
+        import pandas as pd
+
+        if self.strc_index_threshold is None or not strc or pd.isna(strc):
+            return None
+        hits = self.mnxm_fp_index.query(strc, threshold=self.strc_index_threshold, top_k=1)
+        if not hits:
+            return None
+        logging.debug(f'Fingerprint index match for {strc}: {hits[0]}')
+        return hits[0][0]
+
+
+    def _strc_inchikey(self, mid: str) -> Optional[str]:
+        """Return the InChIKey of a RP2 or MetaNetX compound, if known"""
+        inchikey = (
+            self.rp_strc.get(mid, {}).get('xref', {}).get('inchi_key')
+            or self.rp_strc.get(mid, {}).get('desc', {}).get('inchikey')
+            or self.mnxm_prop.get(mid, {}).get('InChIKey')
+        )
+        if not isinstance(inchikey, str) or not inchikey:
+            return None
+        return inchikey
+
+
+    def _recipe_inchikey_lookup(
+        self,
+        rp_rule_reac: str,
+        ori_reactants: Dict[str, Any],
+        ori_products: Dict[str, Any],
+    ) -> Dict[str, Dict[str, Optional[str]]]:
+        """Return the InChIKey index of a recipe, building and caching it on first use.
+
+        For each side of the recipe, both the full InChIKey and its first two blocks are
+        mapped to the MNXM. Keys shared by several species of the same side map to None
+        so that they are never used as an exact match.
+
+        Args:
+            rp_rule_reac (str): The MNXR of the recipe.
+            ori_reactants (Dict[str, Any]): The recipe reactants.
+            ori_products (Dict[str, Any]): The recipe products.
+
+        Returns:
+            Dict[str, Dict[str, Optional[str]]]: {'reactants': {inchikey: mnxm}, 'products': {inchikey: mnxm}}
+        """
+        if rp_rule_reac not in self._recipe_inchikey_index:
+            index: Dict[str, Dict[str, Optional[str]]] = {}
+            for side, ori_spe in zip(['reactants', 'products'], [ori_reactants, ori_products]):
+                index[side] = {}
+                for mid in ori_spe:
+                    inchikey = self._strc_inchikey(mid)
+                    if not inchikey:
+                        continue
+                    for key in {inchikey, '-'.join(inchikey.split('-')[:2])}:
+                        if index[side].get(key, mid) != mid:
+                            index[side][key] = None
+                        else:
+                            index[side][key] = mid
+            self._recipe_inchikey_index[rp_rule_reac] = index
+        return self._recipe_inchikey_index[rp_rule_reac]
+
+
+    def _recipe_strc_pool(
+        self,
+        rp_rule_reac: str,
+        ori_reactants: Dict[str, Any],
+        ori_products: Dict[str, Any],
+    ) -> Tuple[Dict[str, Dict[str, str]], List[str]]:
+        """Return the structures of the species of a recipe, resolving and caching them on first use.
+
+        The structure of a species comes from the RP2 compounds (InChI, then SMILES) when it
+        is one of them, otherwise from the structure pool precomputed in ``rr_recipes``, whose
+        fingerprints are added to ``self.fp_cache``. Recipes without a precomputed pool are
+        resolved from ``mnxm_prop``.
+
+        Args:
+            rp_rule_reac (str): The MNXR of the recipe.
+            ori_reactants (Dict[str, Any]): The recipe reactants.
+            ori_products (Dict[str, Any]): The recipe products.
+
+        Returns:
+            Tuple[Dict[str, Dict[str, str]], List[str]]: ({'reactants': {mnxm: strc}, 'products': {mnxm: strc}},
+            species without a structure). Both are shared between calls and must not be modified.
+        """
+        if rp_rule_reac not in self._recipe_strc_pools:
+            strc_pool = self.rr_recipes.get(rp_rule_reac, {}).get('strc_pool')
+            ori_strc_dict: Dict[str, Dict[str, str]] = {'reactants': {}, 'products': {}}
+            left_out: List[str] = []
+            for side, ori_spe in zip(['reactants', 'products'], [ori_reactants, ori_products]):
+                for mid in ori_spe:
+                    if strc_pool is not None and mid not in self.rp_strc:
+                        strc, fp = strc_pool.get(mid, (None, None))
+                        if strc is not None:
+                            self.fp_cache.put(strc, fp_from_text(fp), radius=STRC_POOL_RADIUS, n_bits=STRC_POOL_N_BITS)
+                    else:
+                        strc = self._strc_structure(mid)
+                    if strc is None:
+                        logging.warning(f"Cannot recover the structure for {mid}")
+                        left_out.append(mid)
+                    else:
+                        ori_strc_dict[side][mid] = strc
+            self._recipe_strc_pools[rp_rule_reac] = (ori_strc_dict, left_out)
+        return self._recipe_strc_pools[rp_rule_reac]
+
+
+    def _strc_structure(self, mid: str) -> Optional[str]:
+        """Return the InChI (or SMILES when there is no InChI) of a RP2 or MetaNetX compound, if known"""
+        import pandas as pd
+
+        inchi = (
+            self.rp_strc.get(mid, {}).get("xref", {}).get("inchi")
+            or self.rp_strc.get(mid, {}).get("desc", {}).get("inchi")
+            or self.mnxm_prop.get(mid, {}).get("InChI")
+        )
+        smiles = (
+            self.rp_strc.get(mid, {}).get("xref", {}).get("smiles")
+            or self.rp_strc.get(mid, {}).get("desc", {}).get("smiles")
+            or self.mnxm_prop.get(mid, {}).get("SMILES")
+        )
+        if inchi and not pd.isna(inchi):
+            return inchi
+        if smiles and not pd.isna(smiles):
+            return smiles
+        return None
+
+
+    def _exact_inchikey_match(self, mid: str, inchikey_index: Dict[str, Optional[str]]) -> Optional[str]:
+        """Return the recipe species with the same InChIKey (or first two blocks) as a RP2 compound"""
+        inchikey = self._strc_inchikey(mid)
+        if not inchikey:
+            return None
+        return inchikey_index.get(inchikey) or inchikey_index.get('-'.join(inchikey.split('-')[:2]))
 
 
     #### RP2 output readers
@@ -104,7 +357,8 @@ class ParserRP2(RR_Data):
 
         This function parses the output of rp2paths (pathways CSV) and reconstructs
         the nested pathway structure. Each pathway is broken down into steps and
-        sub-steps, storing rule, reaction, and compound information.
+        sub-steps, storing rule, reaction, and compound information. The step numbers
+        and the Left/Right columns are computed column-wise with pandas.
 
         The output has the following structure:
             rp_paths[path_id][step][sub_step] = {
@@ -126,148 +380,200 @@ class ParserRP2(RR_Data):
                 - Nested dictionary describing pathways if successful.
                 - False if parsing fails due to malformed data or missing file.
         """
-        rp_paths = {}
-        current_path_id = None
-        path_step = 0
+        import pandas as pd
+
         try:
             df = pd.read_csv(rp2paths_path)
-            df['Transformation ID'] = [i[:-2] for i in df['Unique ID']]
-            required_cols = {"Path ID", "Unique ID", "Rule ID", "Left", "Right"}
-            if not required_cols.issubset(df.columns):
-                logging.error(f"Missing required columns in {rp2paths_pathways}. Found: {list(df.columns)}")
-                return False
-            for _, row in df.iterrows():
-                # Parse path id and step counter
-                try:
-                    pid = int(row["Path ID"])
-                except (TypeError, ValueError):
-                    logging.error(f"Cannot convert Path ID to int ({row['Path ID']})")
-                    return False
-                if pid != current_path_id:
-                    path_step = 1
-                    current_path_id = pid
-                else:
-                    path_step += 1
-                # Parse reactants/products
-                def parse_side(text: str) -> Dict[str, int]:
-                    side: Dict[str, int] = {}
-                    txt = str(text).replace("'", "").replace("-", "_").replace("+", "")
-                    if not txt or txt == "nan":
-                        return side
-                    for chunk in txt.split(":"):
-                        if not chunk:
-                            continue
-                        parts = chunk.split(".", 1)
-                        if len(parts) != 2:
-                            logging.warning(f"Malformed side chunk '{chunk}' in '{txt}'")
-                            continue
-                        sto_str, name = parts[0].strip(), parts[1].strip()
-                        try:
-                            sto = int(sto_str)
-                        except ValueError:
-                            logging.error(f"Cannot convert stoichiometry to int ({sto_str})")
-                            return {}
-                        cid = self.single_depr_mnxm(name)
-                        side[cid] = sto
-                    return side
-                left = parse_side(row["Left"])
-                right = parse_side(row["Right"])
-                if (pd.notna(row["Left"]) and not left) or (pd.notna(row["Right"]) and not right):
-                    return False
-                # For each rule_id, look up reactions from retrorules_prop
-                for r_id in str(row["Rule ID"]).split(","):
-                    if r_id=='nan' or not r_id:
-                        logging.warning(f'The following rule id is empty: {r_id}')
-                        continue
-                    rr_reacts = self.retrorules_prop.get(r_id.strip(), {})
-                    if not rr_reacts:
-                        logging.warning(f'Cannot recover the following rule: {r_id}') 
-                    for react in rr_reacts:
-                        #there can be multiple substrates for each reaction
-                        for sub in rr_reacts[react]:
-                            rp_paths.setdefault(current_path_id, {}).setdefault(path_step, {}).setdefault(r_id, {}).setdefault(react, {})[sub] = {
-                                "rule_id": r_id,
-                                "rule_mnxr": react,
-                                "rule_mnxm": sub,
-                                "rule_score": rr_reacts[react][sub].get("Score", 0.0),
-                                "right": dict(right),
-                                "left": dict(left),
-                                "path_id": pid,
-                                "step": path_step,
-                                "transformation_id": row.get("Transformation ID"),
-                            }
         except FileNotFoundError:
-            logging.error(f"Cannot find file: {rp2paths_pathways}")
+            logging.error(f"Cannot find file: {rp2paths_path}")
             return False
         except OSError as e:
-            logging.error(f"Error reading {rp2paths_pathways}: {e}")
+            logging.error(f"Error reading {rp2paths_path}: {e}")
             return False
+        required_cols = {"Path ID", "Unique ID", "Rule ID", "Left", "Right"}
+        if not required_cols.issubset(df.columns):
+            logging.error(f"Missing required columns in {rp2paths_path}. Found: {list(df.columns)}")
+            return False
+        return self._rp2paths_from_df(df)
+
+
+    def _rp2paths_from_df(self, df: pd.DataFrame) -> Union[Dict[int, Dict[int, Dict[int, Dict[str, Any]]]], bool]:
+        """Build the nested rp_paths dictionary from (a part of) the rp2paths output.
+
+        Only the RetroRules entries referenced in ``df`` are fetched, in bulk, from
+        the on-disk RetroRules store.
+
+        Args:
+            df (pd.DataFrame): Rows of the rp2paths output, with at least the columns
+                "Path ID", "Unique ID", "Rule ID", "Left" and "Right".
+
+        Returns:
+            Union[Dict[int, Dict[int, Dict[int, Dict[str, Any]]]], bool]: See `_read_rp2paths`.
+        """
+        import pandas as pd
+
+        rp_paths = {}
+        df = df.copy()
+        df['Transformation ID'] = df['Unique ID'].astype(str).str[:-2]
+        # Parse path id and step counter (the step restarts every time the path id changes)
+        pids = pd.to_numeric(df['Path ID'], errors='coerce')
+        if pids.isna().any() or (pids % 1 != 0).any():
+            logging.error(f"Cannot convert Path ID to int ({df['Path ID'][pids.isna() | (pids % 1 != 0)].iloc[0]})")
+            return False
+        df['Path ID'] = pids.astype(int)
+        path_runs = (df['Path ID'] != df['Path ID'].shift()).cumsum()
+        df['step'] = df.groupby(path_runs).cumcount() + 1
+        # Parse reactants/products
+        sides = {}
+        for col in ('Left', 'Right'):
+            sides[col] = self._parse_rp2paths_side(df[col])
+            if sides[col] is None:
+                return False
+        # For each rule_id, look up reactions from retrorules_prop
+        path_ids = df['Path ID'].tolist()
+        steps = df['step'].tolist()
+        transformation_ids = df['Transformation ID'].tolist()
+        rules = df['Rule ID'].astype(str).str.split(',').explode()
+        retrorules = self.get_retrorules(rules.str.strip().unique())
+        for pos, r_id in zip(df.index.get_indexer(rules.index), rules):
+            if r_id=='nan' or not r_id:
+                logging.warning(f'The following rule id is empty: {r_id}')
+                continue
+            rr_reacts = retrorules.get(r_id.strip(), {})
+            if not rr_reacts:
+                logging.warning(f'Cannot recover the following rule: {r_id}') 
+            pid = path_ids[pos]
+            path_step = steps[pos]
+            left = sides['Left'][pos]
+            right = sides['Right'][pos]
+            for react in rr_reacts:
+                #there can be multiple substrates for each reaction
+                for sub in rr_reacts[react]:
+                    rp_paths.setdefault(pid, {}).setdefault(path_step, {}).setdefault(r_id, {}).setdefault(react, {})[sub] = {
+                        "rule_id": r_id,
+                        "rule_mnxr": react,
+                        "rule_mnxm": sub,
+                        "rule_score": rr_reacts[react][sub].get("Score", 0.0),
+                        "right": dict(right),
+                        "left": dict(left),
+                        "path_id": pid,
+                        "step": path_step,
+                        "transformation_id": transformation_ids[pos],
+                    }
         return rp_paths
 
 
-    def _read_rp2scope(self, scope_path: str) -> Dict[str, Dict[str, Any]]:
+    def _parse_rp2paths_side(self, side: pd.Series) -> Optional[List[Dict[str, int]]]:
+        """Parse a Left or Right column of the rp2paths output with vectorized string operations.
+
+        Each cell is of the form "1.MNXM13:1.CMPD_0000000001" and is converted to
+        {"MNXM13": 1, "CMPD_0000000001": 1}, with deprecated MNXM replaced by their
+        current identifier.
+
+        Args:
+            side (pd.Series): The Left or Right column.
+
+        Returns:
+            Optional[List[Dict[str, int]]]: One dictionary per row, in order (empty for missing cells),
+            or None if a stoichiometry cannot be converted or a non empty cell cannot be parsed.
+        """
+        txt = (
+            side.astype(str)
+            .str.replace("'", "", regex=False)
+            .str.replace("-", "_", regex=False)
+            .str.replace("+", "", regex=False)
+        )
+        txt = txt.where(txt != 'nan', '')
+        chunks = txt.str.split(':').explode()
+        chunks = chunks[chunks.notna() & (chunks != '')]
+        parts = chunks.str.partition('.')
+        malformed = parts[1] != '.'
+        for row_idx, chunk in chunks[malformed].items():
+            logging.warning(f"Malformed side chunk '{chunk}' in '{txt[row_idx]}'")
+        parts = parts[~malformed]
+        sto = parts[0].str.strip()
+        bad_sto = ~sto.str.fullmatch(r'\s*\d+\s*').astype(bool)
+        if bad_sto.any():
+            logging.error(f"Cannot convert stoichiometry to int ({sto[bad_sto].iloc[0]})")
+            return None
+        names = parts[2].str.strip()
+        cids = names.map({name: self.single_depr_mnxm(name) for name in names.unique()})
+        parsed: List[Dict[str, int]] = [{} for _ in range(len(side))]
+        positions = side.index.get_indexer(cids.index)
+        for pos, cid, stoichio in zip(positions, cids, sto.astype(int)):
+            parsed[pos][cid] = stoichio
+        if any(not_na and not parsed[pos] for pos, not_na in enumerate(side.notna())):
+            return None
+        return parsed
+
+
+    def _read_rp2scope(self, scope_path: str, reaction_smiles: bool = True) -> Dict[str, Dict[str, Any]]:
         """Parse the RetroPath2 scope CSV file into transformation data.
 
         This function reads an `out_scope.csv` file from RetroPath2 and aggregates
         information by `Transformation ID`, computing the average score and collecting
-        associated reaction SMILES strings.
+        associated reaction SMILES strings and EC numbers.
+
+        Only the needed columns are parsed, as categoricals since every transformation
+        spans several rows, and the aggregation is done in a single pass over the
+        distinct rows.
 
         Args:
             scope_path (str): Path to the RetroPath2 scope CSV file.
+            reaction_smiles (bool): Collect the reaction SMILES. Without it, the largest
+                column of the file is not parsed and "reaction_smiles" is None.
 
         Returns:
             Dict[str, Dict[str, Any]]: A dictionary where each key is a Transformation ID,
             and the value is another dictionary containing:
-                - "score": float, average score of the transformation.
-                - "reaction_smiles": str, reaction SMILES (if unique).
+                - "score": float, average of the distinct scores of the transformation.
+                - "reaction_smiles": str, reaction SMILES (the set of them if not unique).
+                - "ec-code": List[str], sorted distinct EC numbers, without 'NOEC'.
         """
-        def parse_list_strings_flat(lst):
-            """Convert string lists like '[4.4.1.1, 4.5.1.2, NOEC]' into a flat list of unique EC numbers,
-            ignoring 'NOEC' entries."""
-            items = []
-            for s in lst:
-                s = s.strip().strip("[]")
-                if s:
-                    parts = [x.strip() for x in s.split(",")]
-                    items.extend(p for p in parts if p and p.upper() != "NOEC")
-            return sorted(set(items))
-        df = pd.read_csv(scope_path)
-        # Compute mean scores per transformation
-        transf_id__score = (
-            df[['Transformation ID', 'Score']]
-            .groupby('Transformation ID')['Score']
-            .apply(set)
-            .to_dict()
-        )
-        transf_id__score = {tid: np.mean(list(scores)) for tid, scores in transf_id__score.items()}
-        # Collect unique reaction SMILES per transformation
-        transf_id__reaction_smiles = (
-            df[['Transformation ID', 'Reaction SMILES']]
-            .groupby('Transformation ID')['Reaction SMILES']
-            .apply(set)
-            .to_dict()
-        )
-        for tid, smiles_set in transf_id__reaction_smiles.items():
-            if len(smiles_set) == 1:
-                transf_id__reaction_smiles[tid] = list(smiles_set)[0]
-            else:
-                logging.warning(f"Multiple reaction SMILES found for {tid}: {smiles_set}")
-        # Collect the EC numbers
-        transf_id__ec = (
-                df[['Transformation ID', 'EC number']]
-                .groupby('Transformation ID')['EC number']
-                .apply(parse_list_strings_flat)
-                .to_dict()
-        )
-        # Combine into structured dictionary
-        scope = {
-            tid: {
-                "score": transf_id__score.get(tid, np.nan),
-                "reaction_smiles": transf_id__reaction_smiles.get(tid, None),
-                "ec-code": transf_id__ec.get(tid, []),
+        import pandas as pd
+
+        ec_lists: Dict[str, List[str]] = {}
+
+        def parse_ec(ec_str):
+            """Convert string lists like '[4.4.1.1, 4.5.1.2, NOEC]' into EC numbers, ignoring 'NOEC' entries."""
+            if ec_str not in ec_lists:
+                items = []
+                if isinstance(ec_str, str):
+                    items = [x.strip() for x in ec_str.strip().strip("[]").split(",")]
+                ec_lists[ec_str] = [p for p in items if p and p.upper() != "NOEC"]
+            return ec_lists[ec_str]
+
+        columns = ['Transformation ID', 'Score', 'EC number'] + (['Reaction SMILES'] if reaction_smiles else [])
+        df = pd.read_csv(
+            scope_path,
+            usecols=columns,
+            dtype={col: 'category' for col in columns if col != 'Score'} | {'Score': 'float64'},
+        )[columns].drop_duplicates()
+        df = df[df['Transformation ID'].notna()]
+        scores: Dict[str, set] = {}
+        ecs: Dict[str, set] = {}
+        smiles: Dict[str, set] = {}
+        rows = zip(*(df[col].tolist() for col in columns))
+        for row in rows:
+            tid = row[0]
+            scores.setdefault(tid, set()).add(row[1])
+            ecs.setdefault(tid, set()).update(parse_ec(row[2]))
+            if reaction_smiles:
+                smiles.setdefault(tid, set()).add(row[3])
+        scope = {}
+        for tid in sorted(scores):
+            tid_smiles = None
+            if reaction_smiles:
+                tid_smiles = smiles[tid]
+                if len(tid_smiles) == 1:
+                    tid_smiles = next(iter(tid_smiles))
+                else:
+                    logging.warning(f"Multiple reaction SMILES found for {tid}: {tid_smiles}")
+            scope[tid] = {
+                "score": sum(scores[tid]) / len(scores[tid]),
+                "reaction_smiles": tid_smiles,
+                "ec-code": sorted(ecs[tid]),
             }
-            for tid in transf_id__score.keys()
-        }
         return scope
 
 
@@ -280,9 +586,10 @@ class ParserRP2(RR_Data):
           - column 0: compound identifier (CID)
           - column 1: SMILES string
 
-        For each row, it attempts to fetch `inchi` and `inchikey` via
-        `self.queryCIDstrc(cid)`. If missing, it tries to derive them by
-        converting the SMILES using `self._convert_depiction`.
+        The InChI and InChIKey of every compound are derived from its SMILES in a
+        single batch with `convert_depictions` (spread over `self.n_workers` processes),
+        and then used to recover the xref in this process.
+        Compounds whose SMILES cannot be parsed are kept with their SMILES only.
 
         Args:
             path: Path to the compounds TSV file.
@@ -293,27 +600,29 @@ class ParserRP2(RR_Data):
         Raises:
             RuntimeError: If the file cannot be read.
         """
+        import pandas as pd
+
         rp_strc: Dict[str, Dict[str, Any]] = {}
         try:
             # File has a header line; skip it and use positional columns like the original.
             df = pd.read_csv(path)
-            for _, row in df.iterrows():
+            # InChI and InChIKey, parsing each SMILES once
+            all_conv = convert_depictions(
+                df.iloc[:, 1].astype(str),
+                itype="smiles",
+                otype=("inchi", "inchikey"),
+                n_workers=self.n_workers,
+            )
+            for (_, row), (res_conv, conv_error) in zip(df.iterrows(), all_conv):
                 cid = str(row.iloc[0])
                 logging.debug(f'---- {cid} ----')
                 smiles = str(row.iloc[1])
                 tmp_strc = {"smiles": smiles}
-                # InChI
-                try:
-                    res_conv = convert_depiction(idepic=smiles, itype="smiles", otype={"inchi"})
+                if conv_error:
+                    logging.warning(f"Could not convert SMILES to InChI/InChIKey for CID={cid}: {smiles!r} ({conv_error})")
+                else:
                     tmp_strc["inchi"] = res_conv["inchi"]
-                except NotImplementedError:
-                    logging.warning(f"Could not convert SMILES to InChI for CID={cid}: {smiles!r}")
-                # InChIKey
-                try:
-                    res_conv = convert_depiction(idepic=smiles, itype="smiles", otype={"inchikey"})
                     tmp_strc["inchi_key"] = res_conv["inchikey"]
-                except NotImplementedError:
-                    logging.warning(f"Could not convert SMILES to InChIKey for CID={cid}: {smiles!r}")
                 # get the xref
                 out_xref = {}
                 out_desc = {}
@@ -330,7 +639,7 @@ class ParserRP2(RR_Data):
                         out_desc = {k: v for k, v in xref.items() if k != 'xref'}
                     except KeyError:
                         pass
-                else:
+                elif "inchi_key" in tmp_strc:
                     try:
                         mnxm = self.inchikey_mnxm[tmp_strc["inchi_key"]]
                         xref, _ = self.mnxm_xref(mnxm)
@@ -353,11 +662,19 @@ class ParserRP2(RR_Data):
                             )
                             out_desc = {k: v for k, v in xref.items() if k != 'xref'}
                         except KeyError:
-                            xref = self.exact_pubchem_search(
-                                    query=tmp_strc["inchi_key"], 
-                                    itype='inchikey', 
-                                    return_lowest_cid=True
-                            )
+                            xref = None
+                            mnxm = self._strc_index_mnxm(tmp_strc.get("inchi") or smiles)
+                            if mnxm:
+                                try:
+                                    xref, _ = self.mnxm_xref(mnxm)
+                                except KeyError:
+                                    logging.warning(f'Cannot find the xref of the index match {mnxm} for CID={cid}')
+                            if not xref:
+                                xref = self.exact_pubchem_search(
+                                        query=tmp_strc["inchi_key"], 
+                                        itype='inchikey', 
+                                        return_lowest_cid=True
+                                )
                             xref = {k.lower(): v for k, v in xref.items()}
                             out_xref = {**tmp_strc, **{k: v for k, v in xref['xref'].items() if k not in tmp_strc}}
                             out_xref = merge_annot_dicts(
@@ -366,6 +683,9 @@ class ParserRP2(RR_Data):
                             )
                             out_desc = {k: v for k, v in xref.items() if k != 'xref'}
                             #TODO: use the xref and search for the best info
+                else:
+                    # the SMILES could not be converted, keep it as the only structure
+                    out_xref = dict(tmp_strc)
                 if not 'inchi' in out_xref and 'InChI' in out_desc:
                     if not pd.isna(out_desc['InChI']):
                         out_xref['inchi'] = out_desc['InChI']
@@ -388,109 +708,250 @@ class ParserRP2(RR_Data):
 
     #### Convert Monocomponent Reactions
 
-    def _extract_all_paths(
+    @staticmethod
+    def _step_choices(
+            steps_dict: Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]
+        ) -> Optional[List[Tuple[int, List[Step]]]]:
+        """Return the (rule, reaction, substrate) choices of every step of a pathway.
+
+        Every choice is a single ``Step`` record, shared by all the subpaths that contain it.
+
+        Args:
+            steps_dict: rp_paths[path_id], i.e. {step: {rule_id: {reaction_id: {substrate_id: {...}}}}}
+
+        Returns:
+            Optional[List[Tuple[int, List[Step]]]]: (step, choices) in step order,
+            or None if there are no steps or they are not consecutive (no subpath can connect them).
+        """
+        path_steps = sorted(steps_dict.keys())
+        if not path_steps or path_steps != list(range(path_steps[0], path_steps[-1] + 1)):
+            return None
+        return [
+            (
+                step,
+                [
+                    Step.interned(rule_id, react_id, sub_id)
+                    for rule_id, react_dict in steps_dict[step].items()
+                    for react_id, sub_dict in react_dict.items()
+                    for sub_id in sub_dict
+                ],
+            )
+            for step in path_steps
+        ]
+
+    @classmethod
+    def count_subpaths(cls, steps_dict: Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]) -> int:
+        """Return the number of subpaths of a pathway without enumerating them.
+
+        Args:
+            steps_dict: rp_paths[path_id]
+
+        Returns:
+            int: The product of the number of (rule, reaction, substrate) choices of every step.
+        """
+        step_choices = cls._step_choices(steps_dict)
+        if not step_choices:
+            return 0
+        return math.prod(len(choices) for _, choices in step_choices)
+
+    @classmethod
+    def iter_subpaths(
+            cls,
+            steps_dict: Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]
+        ) -> Iterator[Dict[int, Step]]:
+        """Lazily enumerate the subpaths of a pathway.
+
+        Every step of a pathway is an independent choice of (rule, reaction, substrate), so
+        the subpaths are the Cartesian product of the per-step choices, in the order of rp_paths.
+
+        Args:
+            steps_dict: rp_paths[path_id]
+
+        Yields:
+            Dict[int, Step]: { step: Step(rule, reaction, substrate), ... }
+        """
+        step_choices = cls._step_choices(steps_dict)
+        if not step_choices:
+            return
+        steps = [step for step, _ in step_choices]
+        for combination in itertools.product(*(choices for _, choices in step_choices)):
+            yield dict(zip(steps, combination))
+
+    @staticmethod
+    def _choice_score(rule_dict: Dict[str, Dict[str, Dict[str, Any]]], choice: Step) -> float:
+        """Return the rule score of a (rule, reaction, substrate) choice, 0.0 when it is unknown"""
+        score = rule_dict[choice.rule][choice.reaction][choice.substrate].get('rule_score', 0.0)
+        if not isinstance(score, (int, float)) or math.isnan(score):
+            return 0.0
+        return float(score)
+
+    @classmethod
+    def iter_best_subpaths(
+            cls,
+            steps_dict: Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]
+        ) -> Iterator[Dict[int, Step]]:
+        """Lazily enumerate the subpaths of a pathway in decreasing order of combined rule score.
+
+        The combined score of a subpath is the sum of the rule scores of its steps. The
+        choices of every step are ranked by score and the product is explored best first
+        with a heap, so taking the first K subpaths only costs O(K * steps * log(K)),
+        whatever the total number of subpaths. Ties keep the order of ``iter_subpaths``.
+
+        Args:
+            steps_dict: rp_paths[path_id]
+
+        Yields:
+            Dict[int, Step]: { step: Step(rule, reaction, substrate), ... }
+        """
+        step_choices = cls._step_choices(steps_dict)
+        if not step_choices or not all(choices for _, choices in step_choices):
+            return
+        steps = [step for step, _ in step_choices]
+        # (score, position in rp_paths, choice) of every step, best first
+        ranked = [
+            sorted(
+                ((cls._choice_score(steps_dict[step], c), pos, c) for pos, c in enumerate(choices)),
+                key=lambda x: -x[0],
+            )
+            for step, choices in step_choices
+        ]
+
+        def heap_entry(idx: Tuple[int, ...]) -> Tuple[float, Tuple[int, ...], Tuple[int, ...]]:
+            # ties are broken on the rp_paths positions, i.e. the order of iter_subpaths
+            return (
+                -sum(ranked[j][i][0] for j, i in enumerate(idx)),
+                tuple(ranked[j][i][1] for j, i in enumerate(idx)),
+                idx,
+            )
+
+        start = (0,) * len(ranked)
+        heap = [heap_entry(start)]
+        seen = {start}
+        while heap:
+            _, _, idx = heapq.heappop(heap)
+            yield {step: ranked[j][i][2] for j, (step, i) in enumerate(zip(steps, idx))}
+            for j in range(len(idx)):
+                if idx[j] + 1 < len(ranked[j]):
+                    nxt = idx[:j] + (idx[j] + 1,) + idx[j + 1:]
+                    if nxt not in seen:
+                        seen.add(nxt)
+                        heapq.heappush(heap, heap_entry(nxt))
+
+    def _prune_infeasible_steps(
             self,
-            rp_paths: Dict[int, Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]]
-        ) -> Dict[int, List[Dict[int, Dict[str, str]]]]:
-        """Extract all paths from nested rp_paths by building a directed graph.
+            path_id: int,
+            steps_dict: Dict[int, Dict[str, Dict[str, Dict[str, Any]]]],
+            match_threshold: float,
+        ) -> Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]:
+        """Remove the (rule, reaction, substrate) choices of a pathway that cannot be completed.
+
+        Whether a step can be completed does not depend on the rest of its subpath
+        (see ``_resolve_step_target``), so every choice is checked once, through the cache
+        of ``_step_target``, and the subpaths containing a failing one are never enumerated.
+        The steps are kept even when none of their choices is left, so that the pathway
+        has no subpath.
 
-        This function creates a directed graph for each pathway, where:
-          step → rule → reaction → substrate → next_step
+        Args:
+            path_id: The Path ID, for logging.
+            steps_dict: rp_paths[path_id]
+            match_threshold: See ``_complete_monocomponent_reaction``.
+
+        Returns:
+            Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]: rp_paths[path_id] without the failing choices.
+        """
+        num_subpaths = self.count_subpaths(steps_dict)
+        pruned: Dict[int, Dict[str, Dict[str, Dict[str, Any]]]] = {}
+        num_pruned = 0
+        for step, rule_dict in steps_dict.items():
+            pruned[step] = {}
+            for rule_id, react_dict in rule_dict.items():
+                for react_id, sub_dict in react_dict.items():
+                    for sub_id, step_io in sub_dict.items():
+                        try:
+                            self._step_target(react_id, step_io['right'], match_threshold)
+                        except KeyError as e:
+                            logging.debug(f'Path {path_id}, step {step}: pruning ({rule_id}, {react_id}, {sub_id}): {e}')
+                            num_pruned += 1
+                            continue
+                        pruned[step].setdefault(rule_id, {}).setdefault(react_id, {})[sub_id] = step_io
+        if num_pruned:
+            num_left = self.count_subpaths(pruned)
+            self.pruned_stats['steps'] += num_pruned
+            self.pruned_stats['subpaths'] += num_subpaths - num_left
+            logging.warning(
+                f'Path {path_id}: pruned {num_pruned} infeasible step choice(s), '
+                f'{num_left} of {num_subpaths} subpaths left'
+            )
+        return pruned
 
-        It then enumerates all simple paths between the first and last step,
-        returning a structured representation of each.
+    def _extract_all_paths(
+            self,
+            rp_paths: Dict[int, Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]],
+            match_threshold: Optional[float] = None,
+        ) -> Dict[int, List[Dict[int, Step]]]:
+        """Extract all the subpaths of every pathway of rp_paths.
+
+        With ``prune_steps``, the step choices that cannot be completed are removed
+        first (see ``_prune_infeasible_steps``). The number of subpaths of a pathway is
+        then computed before they are enumerated (see ``count_subpaths``), and pathways
+        with more than ``max_subpaths`` subpaths are skipped. With ``top_k_subpaths``,
+        only the best K subpaths of every pathway are returned, in decreasing order of
+        combined rule score.
 
         Args:
             rp_paths: Nested dictionary structure:
                 rp_paths[path_id][step][rule_id][reaction_id][substrate_id] -> {...}
+            match_threshold: Used to check the step choices. Defaults to ``match_strc_search_threshold``.
 
         Returns:
             Dict mapping path_id -> list of paths, where each path is a dictionary:
-                { step: {"rule": str, "reaction": str, "substrate": str}, ... }
+                { step: Step(rule, reaction, substrate), ... }
         """
-        to_ret: Dict[int, List[Dict[int, Dict[str, str]]]] = {}
-
+        if match_threshold is None:
+            match_threshold = self.match_strc_search_threshold
+        to_ret: Dict[int, List[Dict[int, Step]]] = {}
         for path_id, steps_dict in rp_paths.items():
-            G = nx.DiGraph()
-            path_steps = sorted(steps_dict.keys())
-
-            if not path_steps:
+            if self.prune_steps:
+                steps_dict = self._prune_infeasible_steps(path_id, steps_dict, match_threshold)
+            num_subpaths = self.count_subpaths(steps_dict)
+            logging.debug(f'Path {path_id}: {num_subpaths} subpaths')
+            if self.top_k_subpaths is not None:
+                to_ret[path_id] = list(itertools.islice(self.iter_best_subpaths(steps_dict), self.top_k_subpaths))
+                continue
+            if self.max_subpaths is not None and num_subpaths > self.max_subpaths:
+                logging.warning(
+                    f'Skipping path {path_id}: {num_subpaths} subpaths (more than max_subpaths={self.max_subpaths})'
+                )
                 to_ret[path_id] = []
                 continue
-
-            min_step, max_step = min(path_steps), max(path_steps)
-
-            # Build directed graph
-            for step, rule_dict in steps_dict.items():
-                G.add_node(step)
-                for rule_id, react_dict in rule_dict.items():
-                    G.add_node(rule_id)
-                    G.add_edge(step, rule_id)
-
-                    for react_id, sub_dict in react_dict.items():
-                        G.add_node(react_id)
-                        G.add_edge(rule_id, react_id)
-
-                        for sub_id in sub_dict.keys():
-                            G.add_node(sub_id)
-                            G.add_edge(react_id, sub_id)
-                            G.add_edge(sub_id, step + 1)
-
-            # Enumerate all simple paths
-            all_paths: List[Dict[int, Dict[str, str]]] = []
-            for node_path in nx.all_simple_paths(G, source=min_step, target=max_step + 1):
-                current_step = None
-                path_data: Dict[int, Dict[str, str]] = {}
-
-                for node in node_path[:-1]:  # skip the last sink node
-                    if isinstance(node, int):
-                        current_step = node
-                        path_data[current_step] = {}
-                    elif isinstance(node, str):
-                        # Identify type by prefix (no regex)
-                        if node.startswith("RR"):
-                            path_data[current_step]["rule"] = node
-                        elif node.startswith("MNXR"):
-                            path_data[current_step]["reaction"] = node
-                        elif node.startswith("MNXM"):
-                            path_data[current_step]["substrate"] = node
-
-                all_paths.append(path_data)
-
-            to_ret[path_id] = all_paths
-
+            to_ret[path_id] = list(self.iter_subpaths(steps_dict))
         return to_ret
 
-    def _complete_monocomponent_reaction(
+    def _resolve_step_target(
         self,
-        input_subpath: Dict[str, Any],
-        rp_path: Dict,
-        match_threshold: float = 0.51,
-        #conv_rp_ids: Dict = {},
-        found_cmp: Dict = {},
-    ) -> None:
-        """
-        Complete a single monocomponent RP2 step by reconciling predicted species with
-        the original reaction recipe and adding any missing reactants/products.
+        rp_rule_reac: str,
+        rp_right: Dict[str, Any],
+        match_threshold: float,
+    ) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, Optional[str]]], str, str, Dict, Dict]:
+        """Identify the predicted major product of a step in its reaction recipe and orient the recipe.
+
+        This is the part of ``_complete_monocomponent_reaction`` that can fail. It does not
+        depend on the RP2 compounds already identified in the subpath, so it is cached on
+        (reaction, RP2 right-hand side, match_threshold) by ``_step_target``.
 
         Args:
-            subpath: Dict with keys 'rule', 'reaction', 'substrate'.
-            match_threshold: Minimum similarity to accept the target match without fallback.
+            rp_rule_reac: The MNXR of the step.
+            rp_right: The RP2 right-hand side of the step.
+            match_threshold: See ``_complete_monocomponent_reaction``.
 
-        NOTE:
-            Main and secondary species are handled separately:
-                - Main reactants/products are used to determine the direction.
-                - Only secondary reactants/products are added if missing.
+        Raises:
+            KeyError: If the recipe is unknown, the right-hand side has several species,
+                or its major product cannot be identified or oriented.
 
         Returns:
-            The updated subpath (mutated copy in-place).
+            Tuple: (recipe structure pool, recipe InChIKey index, RP2 id of the major product,
+            its MNXM, orientated recipe reactants, orientated recipe products)
         """
-        subpath = copy.deepcopy(input_subpath)
-        rp_rule = subpath["rule"]
-        rp_rule_reac = subpath["reaction"]
-        rp_rule_substrate = subpath["substrate"]
-        logging.debug(f'\t\trp_rule: {rp_rule}')
-        logging.debug(f'\t\trp_rule_reac: {rp_rule_reac}')
         # 1) Recover original recipe reactants/products, keeping main and secondary separate
         try:
             # Full recipe (main + secondary) still useful for mapping and logging
@@ -513,34 +974,11 @@ class ParserRP2(RR_Data):
         logging.debug(f"\t\tori_reactants: {ori_reactants}")
         logging.debug(f"\t\tori_products: {ori_products}")
 
-        # 2) Build InChI pool for all species mentioned in the original recipe
+        # 2) Structure pool of all species mentioned in the original recipe
         #    (we keep all, but direction will be based on "main" only)
-        ori_strc_dict: Dict[Dict[str, str]] = {}
-        ori_strc_dict['reactants'] = {}
-        ori_strc_dict['products'] = {}
-        left_out: list[str] = []
-        for type, ori_spe in zip(['reactants', 'products'], [ori_reactants, ori_products]):
-            for mid in ori_spe:
-                inchi = (
-                    self.rp_strc.get(mid, {}).get("xref", {}).get("inchi")
-                    or self.rp_strc.get(mid, {}).get("desc", {}).get("inchi")
-                    or self.mnxm_prop.get(mid, {}).get("InChI")
-                )
-                smiles = (
-                    self.rp_strc.get(mid, {}).get("xref", {}).get("smiles")
-                    or self.rp_strc.get(mid, {}).get("desc", {}).get("smiles")
-                    or self.mnxm_prop.get(mid, {}).get("SMILES")
-                )
-                if inchi and not pd.isna(inchi):
-                    ori_strc_dict[type][mid] = inchi
-                elif smiles and not pd.isna(smiles):
-                    ori_strc_dict[type][mid] = smiles
-                else:
-                    logging.warning(f"Cannot recover the structure for {mid}")
-                    left_out.append(mid)
+        ori_strc_dict, left_out = self._recipe_strc_pool(rp_rule_reac, ori_reactants, ori_products)
 
         # 3) Identify the predicted major product on the RP2 right-hand side
-        rp_right = rp_path[rp_rule][rp_rule_reac][rp_rule_substrate]["right"]
         logging.debug(f"\t\trp_right: {rp_right}")
         if len(rp_right) != 1:
             raise KeyError(f"Multiple elements on RP2 right-hand side: {rp_right}")
@@ -557,10 +995,24 @@ class ParserRP2(RR_Data):
                     or self.rp_strc.get(rp_predict_strc_id, {}).get('desc', {}).get('smiles')
                 )
         logging.debug(f"\t\ttarget_strc: {target_strc}")
-        target_best_mnxm, score = self._best_strc_match(
-            target_strc,
-            ori_strc_dict['reactants'] | ori_strc_dict['products'],
+        inchikey_index = self._recipe_inchikey_lookup(rp_rule_reac, ori_reactants, ori_products)
+        exact_mnxm = (
+            self._exact_inchikey_match(rp_predict_strc_id, inchikey_index['reactants'])
+            or self._exact_inchikey_match(rp_predict_strc_id, inchikey_index['products'])
         )
+        if exact_mnxm:
+            self.inchikey_match_stats['exact'] += 1
+            target_hits, target_margin = [(exact_mnxm, 1.0)], 1.0
+        else:
+            self.inchikey_match_stats['fingerprint'] += 1
+            target_hits, target_margin = self._top_strc_matches(
+                target_strc,
+                ori_strc_dict['reactants'] | ori_strc_dict['products'],
+            )
+        target_best_mnxm, score = target_hits[0] if target_hits else (None, 0.0)
+        logging.debug(f"\t\ttarget_hits: {target_hits} (margin: {target_margin})")
+        if score > match_threshold and len(target_hits) > 1 and target_margin == 0.0:
+            logging.warning(f"Ambiguous RHS match for {rp_predict_strc_id}, using the first hit: {target_hits}")
         #Fallback to unidentified 
         if score <= match_threshold:
             if left_out and len(left_out) == 1:
@@ -586,23 +1038,89 @@ class ParserRP2(RR_Data):
                     raise KeyError(
                         f"Cannot confidently identify the RHS metabolite: left_out: {left_out}, score: {score}"
                     )
-        
-        found_cmp[rp_predict_strc_id] = target_best_mnxm
         logging.debug(f"\t\t{rp_predict_strc_id} -> {target_best_mnxm}")
-        
+
         # 4) Determine orientation using main reactants/products
         if target_best_mnxm in ori_products:
-            reactant_dir, product_dir = "left", "right"
             orientated_reactants = ori_reactants
             orientated_products = ori_products
         elif target_best_mnxm in ori_reactants:
-            reactant_dir, product_dir = "right", "left"
             orientated_reactants = ori_products
             orientated_products = ori_reactants
         else:
             raise KeyError(
                 f"Cannot recognize reactant/product orientation from main species for {target_best_mnxm}"
             )
+        return (
+            ori_strc_dict,
+            inchikey_index,
+            rp_predict_strc_id,
+            target_best_mnxm,
+            orientated_reactants,
+            orientated_products,
+        )
+
+    def _step_target(
+        self,
+        rp_rule_reac: str,
+        rp_right: Dict[str, Any],
+        match_threshold: float,
+    ) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, Optional[str]]], str, str, Dict, Dict]:
+        """Return ``_resolve_step_target``, cached, with a negative cache of the failing steps
+
+        Raises:
+            KeyError: If the step cannot be completed (see ``_resolve_step_target``).
+        """
+        key = (rp_rule_reac, tuple(rp_right), match_threshold)
+        if key in self._infeasible_steps:
+            raise KeyError(self._infeasible_steps[key])
+        if key not in self._step_targets:
+            try:
+                self._step_targets[key] = self._resolve_step_target(rp_rule_reac, rp_right, match_threshold)
+            except KeyError as e:
+                self._infeasible_steps[key] = e.args[0] if e.args else str(e)
+                raise
+        return self._step_targets[key]
+
+    def _complete_monocomponent_reaction(
+        self,
+        input_subpath: Step,
+        rp_path: Dict,
+        match_threshold: float = 0.51,
+        #conv_rp_ids: Dict = {},
+        found_cmp: Dict = {},
+    ) -> CompletedStep:
+        """
+        Complete a single monocomponent RP2 step by reconciling predicted species with
+        the original reaction recipe and adding any missing reactants/products.
+
+        Args:
+            input_subpath: The (rule, reaction, substrate) of the step.
+            match_threshold: Minimum similarity to accept the target match without fallback.
+
+        NOTE:
+            Main and secondary species are handled separately:
+                - Main reactants/products are used to determine the direction.
+                - Only secondary reactants/products are added if missing.
+
+        Returns:
+            CompletedStep: The completed step.
+        """
+        rp_rule = input_subpath.rule
+        rp_rule_reac = input_subpath.reaction
+        rp_rule_substrate = input_subpath.substrate
+        logging.debug(f'\t\trp_rule: {rp_rule}')
+        logging.debug(f'\t\trp_rule_reac: {rp_rule_reac}')
+        rp_right = rp_path[rp_rule][rp_rule_reac][rp_rule_substrate]["right"]
+        (
+            ori_strc_dict,
+            inchikey_index,
+            rp_predict_strc_id,
+            target_best_mnxm,
+            orientated_reactants,
+            orientated_products,
+        ) = self._step_target(rp_rule_reac, rp_right, match_threshold)
+        found_cmp[rp_predict_strc_id] = target_best_mnxm
 
         # 5) Fetch predicted sides for this step
         rp_reactants = rp_path[rp_rule][rp_rule_reac][rp_rule_substrate]['left']
@@ -625,7 +1143,12 @@ class ParserRP2(RR_Data):
                     or self.rp_strc.get(rp_predict_strc_id, {}).get('xref', {}).get('smiles')
                     or self.rp_strc.get(rp_predict_strc_id, {}).get('desc', {}).get('smiles')
                 )
-                if search_str:
+                exact_mnxm = self._exact_inchikey_match(mid, inchikey_index['reactants'])
+                if exact_mnxm:
+                    self.inchikey_match_stats['exact'] += 1
+                    reactants_rp2ori[mid] = exact_mnxm
+                elif search_str:
+                    self.inchikey_match_stats['fingerprint'] += 1
                     best_mnxm, _ = self._best_strc_match(search_str, ori_strc_dict['reactants'])
                     reactants_rp2ori[mid] = best_mnxm
                 else:
@@ -645,7 +1168,12 @@ class ParserRP2(RR_Data):
                     or self.rp_strc.get(rp_predict_strc_id, {}).get('xref', {}).get('smiles')
                     or self.rp_strc.get(rp_predict_strc_id, {}).get('desc', {}).get('smiles')
                 )
-                if search_str:
+                exact_mnxm = self._exact_inchikey_match(mid, inchikey_index['products'])
+                if exact_mnxm:
+                    self.inchikey_match_stats['exact'] += 1
+                    products_rp2ori[mid] = exact_mnxm
+                elif search_str:
+                    self.inchikey_match_stats['fingerprint'] += 1
                     best_mnxm, _ = self._best_strc_match(search_str, ori_strc_dict['products'])
                     products_rp2ori[mid] = best_mnxm
                 else:
@@ -684,82 +1212,438 @@ class ParserRP2(RR_Data):
         logging.debug(f"\t\tto_add_reactants (secondary only): {to_add_reactants}")
         logging.debug(f"\t\tto_add_products (secondary only): {to_add_products}")
 
-        # 9) Populate the completed subpath
-        subpath["reactants"] = copy.deepcopy(rp_reactants)
-        subpath["products"] = copy.deepcopy(rp_products)
-        subpath["transformation_id"] = rp_path[rp_rule][rp_rule_reac][rp_rule_substrate][
-            "transformation_id"
-        ]
-        #subpath["direction"] = 1 if reactant_dir=='left' else -1
-
-        # Add any missing SECONDARY species with their stoichiometries
-        for mid in to_add_products:
-            subpath["products"][mid] = orientated_products[mid]
-        for mid in to_add_reactants:
-            subpath["reactants"][mid] = orientated_reactants[mid]
+        # 9) Populate the completed subpath, adding any missing SECONDARY species with their stoichiometries
+        full_reactants = {**rp_reactants, **{mid: orientated_reactants[mid] for mid in to_add_reactants}}
+        full_products = {**rp_products, **{mid: orientated_products[mid] for mid in to_add_products}}
+        #direction = 1 if reactant_dir=='left' else -1
 
-        logging.debug(f"\t\tfull reactants: {subpath['reactants']}")
-        logging.debug(f"\t\tfull products: {subpath['products']}")
+        logging.debug(f"\t\tfull reactants: {full_reactants}")
+        logging.debug(f"\t\tfull products: {full_products}")
         logging.debug("\t -------")
 
-        return subpath#, conv_rp_ids
+        return CompletedStep(
+            rule=rp_rule,
+            reaction=rp_rule_reac,
+            substrate=rp_rule_substrate,
+            transformation_id=rp_path[rp_rule][rp_rule_reac][rp_rule_substrate]["transformation_id"],
+            reactants=intern_stoichiometry(full_reactants),
+            products=intern_stoichiometry(full_products),
+        )#, conv_rp_ids
+
+    def _complete_step(
+        self,
+        input_subpath: Step,
+        rp_path: Dict,
+        match_threshold: float,
+        found_cmp: Dict,
+        step_memo: Optional[Dict[Tuple, Tuple]] = None,
+    ) -> CompletedStep:
+        """Complete a step with ``_complete_monocomponent_reaction``, reusing earlier results.
+
+        Besides the step itself, the completion only depends on the entries of ``found_cmp``
+        for the RP2 species of the step, so the result (or the KeyError) is memoized on those
+        and the updates the step makes to ``found_cmp`` are replayed on a hit.
+
+        Args:
+            input_subpath: The (rule, reaction, substrate) of the step.
+            rp_path: rp_paths[path_id][step] of the step.
+            match_threshold: See ``_complete_monocomponent_reaction``.
+            found_cmp: The RP2 compounds already identified in the subpath. Updated in place.
+            step_memo: The memo of the steps of the pathway, or None to always recompute.
+
+        Returns:
+            CompletedStep: The completed step, shared by all the hits of the memo.
+        """
+        try:
+            step_io = rp_path[input_subpath.rule][input_subpath.reaction][input_subpath.substrate]
+        except (KeyError, TypeError):
+            step_io = None
+        if step_memo is None or step_io is None:
+            return self._complete_monocomponent_reaction(
+                input_subpath, rp_path=rp_path, match_threshold=match_threshold, found_cmp=found_cmp,
+            )
+        context = tuple(
+            (cid, found_cmp[cid]) for cid in sorted(step_io['left'].keys() | step_io['right'].keys()) if cid in found_cmp
+        )
+        key = (input_subpath, match_threshold, context)
+        if key in step_memo:
+            self.step_memo_stats['hits'] += 1
+            completed, found_update, error = step_memo[key]
+        else:
+            self.step_memo_stats['misses'] += 1
+            step_found_cmp = dict(found_cmp)
+            try:
+                completed = self._complete_monocomponent_reaction(
+                    input_subpath, rp_path=rp_path, match_threshold=match_threshold, found_cmp=step_found_cmp,
+                )
+                error = None
+            except KeyError as e:
+                completed, error = None, e
+            found_update = {k: v for k, v in step_found_cmp.items() if k not in found_cmp or found_cmp[k] != v}
+            step_memo[key] = (completed, found_update, error)
+        if error is not None:
+            raise KeyError(*error.args)
+        found_cmp.update(found_update)
+        return completed
+
+
+    @staticmethod
+    def _suffix_trie(rp_subpaths: List[Dict[int, Step]]) -> Dict[str, Any]:
+        """Organize the subpaths of a pathway into a trie of their steps in reverse order.
+
+        Every node is a step shared by all the subpaths with the same suffix:
+        {'step': int, 'input': Step, 'children': {(step, Step): node},
+        'leaves': [indices of the subpaths that start at this step], 'size': number of subpaths below}
+
+        Args:
+            rp_subpaths: The subpaths of the pathway (see ``iter_subpaths``).
+
+        Returns:
+            Dict[str, Any]: The root of the trie.
+        """
+        root: Dict[str, Any] = {'children': {}, 'leaves': [], 'size': 0}
+        for idx, rp_subpath in enumerate(rp_subpaths):
+            node = root
+            node['size'] += 1
+            for path_step in sorted(rp_subpath.keys(), reverse=True):
+                step = rp_subpath[path_step]
+                key = (path_step, step)
+                if key not in node['children']:
+                    node['children'][key] = {'step': path_step, 'input': step, 'children': {}, 'leaves': [], 'size': 0}
+                node = node['children'][key]
+                node['size'] += 1
+            node['leaves'].append(idx)
+        return root
+
+
+    def _complete_subpaths(
+        self,
+        rp_path_num: int,
+        rp_subpaths: List[Dict[int, Step]],
+        rp_path: Dict[int, Any],
+        match_threshold: float,
+    ) -> List[Dict[int, CompletedStep]]:
+        """Complete the subpaths of a pathway, completing every shared suffix once.
+
+        Subpaths are completed from their last step backwards, and the RP2 compounds
+        identified along the way (``found_cmp``) are passed on to the earlier steps. The
+        subpaths are therefore walked as a trie of reversed steps (see ``_suffix_trie``):
+        each node is completed once and ``found_cmp`` is forked where the suffixes branch.
+        A step that fails drops all the subpaths below it. Subpaths sharing a suffix share
+        the (immutable) ``CompletedStep`` records of that suffix.
+
+        Args:
+            rp_path_num: The Path ID.
+            rp_subpaths: The subpaths of the pathway.
+            rp_path: rp_paths[rp_path_num].
+            match_threshold: See ``_complete_monocomponent_reaction``.
+
+        Returns:
+            List[Dict[int, CompletedStep]]: The completed subpaths, in the order of ``rp_subpaths``.
+        """
+        trie = self._suffix_trie(rp_subpaths)
+        step_memo = {} if self.memoize_steps else None
+        completed: Dict[int, Dict[int, CompletedStep]] = {}
+        started = time.monotonic()
+        state = {'done': 0, 'stopped': False}
+
+        def complete_node(node, found_cmp, completed_steps):
+            for child in node['children'].values():
+                if state['done'] and self.subpath_time_budget is not None and time.monotonic() - started > self.subpath_time_budget:
+                    state['stopped'] = True
+                    return
+                child_found_cmp = dict(found_cmp) if len(node['children']) > 1 else found_cmp
+                try:
+                    done = self._complete_step(
+                        child['input'],
+                        rp_path=rp_path[child['step']],
+                        match_threshold=match_threshold,
+                        found_cmp=child_found_cmp,
+                        step_memo=step_memo,
+                    )
+                except KeyError as e:
+                    logging.warning(
+                        f"Skipping {child['size']} subpath(s) of path {rp_path_num} at step {child['step']} "
+                        f"because of the following KeyError: {e}"
+                    )
+                    state['done'] += child['size']
+                    continue
+                child_steps = {**completed_steps, child['step']: done}
+                for idx in child['leaves']:
+                    completed[idx] = dict(child_steps)
+                state['done'] += len(child['leaves'])
+                complete_node(child, child_found_cmp, child_steps)
+                if state['stopped']:
+                    return
+
+        for idx in trie['leaves']:
+            completed[idx] = {}
+        complete_node(trie, {}, {})
+        if state['stopped']:
+            logging.warning(
+                f"Time budget of {self.subpath_time_budget}s reached for path {rp_path_num}: "
+                f"skipping {trie['size'] - state['done']} of its subpaths"
+            )
+        return [completed[idx] for idx in sorted(completed)]
+
 
     def _process_all_paths(
         self,
         all_paths: Dict[int, Any],
         match_threshold: float = 0.8,
-    ) -> None:
+        rp_paths: Optional[Dict[int, Any]] = None,
+    ) -> Dict[int, List[Dict[int, CompletedStep]]]:
         """Iterate through all pathway structures and process each subpath step.
 
         This function iterates over all pathway entries, invoking 
         _step_complete_monocomponent_reaction on each step of
         every subpath. It handles missing keys gracefully and logs warnings.
+        With ``subpath_time_budget``, the remaining subpaths of a pathway are
+        skipped once its completion has taken longer than the budget (the first
+        subpath is always attempted).
+
+        With ``n_workers`` > 1, the Path IDs are completed by forked worker processes
+        that inherit the parser (rr_recipes, rp_strc, ...), ``all_paths`` and ``rp_paths``
+        copy-on-write; only the Path IDs and the completed subpaths are pickled. The
+        results are returned in the order of ``all_paths`` whatever the number of workers.
 
         Args:
-            step_function: Function to apply to each path step. It must accept a dict.
+            all_paths: The subpaths of every Path ID (see ``_extract_all_paths``).
+            match_threshold: See ``_complete_monocomponent_reaction``.
+            rp_paths: The rp_paths the subpaths were extracted from. Defaults to ``self.rp_paths``.
 
         Returns:
-            None
+            Dict[int, List[Dict[int, CompletedStep]]]: {path_id: [{step: CompletedStep}, ...]}, the
+            completed subpaths of every Path ID in the order of ``all_paths``.
         """
+        from tqdm import tqdm
+
+        global _COMPLETION_DATA
+        if rp_paths is None:
+            rp_paths = self.rp_paths
         to_ret = {}
-        path_iterator = tqdm(all_paths, desc='Processing RP2 completed paths') if self.use_progressbar else all_paths
-        for rp_path_num in path_iterator:
+        path_nums = list(all_paths)
+        progress = tqdm(total=len(path_nums), desc='Processing RP2 completed paths', disable=not self.use_progressbar)
+
+        def complete(rp_path_num):
             logging.debug(f'------ Path: {rp_path_num} -------')
-            to_ret[rp_path_num] = []
-            count = 0
-            for rp_subpath in all_paths[rp_path_num]:
-                count += 1
-                logging.debug(f'------ SubPath: {count} -------')
-                #conv_rp_ids = {}
-                to_overwrite = {}
-                found_cmp = {}
-                is_valid = True
-                for path_step in sorted(rp_subpath.keys(), reverse=True):
-                    try:
-                        #to_overwrite[path_step], conv_rp_ids = self._complete_monocomponent_reaction(
-                        to_overwrite[path_step] = self._complete_monocomponent_reaction(
-                                rp_subpath[path_step],
-                                rp_path=self.rp_paths[rp_path_num][path_step],
-                                match_threshold=match_threshold,
-                                #conv_rp_ids=conv_rp_ids,
-                                found_cmp=found_cmp,
-                            )
-                        #logging.debug(f"\tconv_rp_ids: {conv_rp_ids}")
-                    except KeyError as e:
-                        logging.warning(f"Skipping path {rp_path_num} subpath {count} because of the following KeyError: {e}")
-                        is_valid = False
-                        break
-                if is_valid:
-                    to_ret[rp_path_num].append(to_overwrite)
+            to_ret[rp_path_num] = self._complete_subpaths(
+                rp_path_num,
+                all_paths[rp_path_num],
+                rp_path=rp_paths.get(rp_path_num, {}),
+                match_threshold=match_threshold,
+            )
+            progress.update()
+
+        # the first Path ID is completed in process so that the tables it loads are inherited by the workers
+        for rp_path_num in path_nums[:1]:
+            complete(rp_path_num)
+        if self.n_workers > 1 and len(path_nums) > 1 and "fork" in mp.get_all_start_methods():
+            # the workers inherit the parser, its tables and the subpaths copy-on-write, only the Path IDs are sent
+            _COMPLETION_DATA = (self, all_paths, rp_paths, match_threshold)
+            try:
+                with mp.get_context("fork").Pool(self.n_workers) as pool:
+                    chunksize = max(1, (len(path_nums) - 1) // (self.n_workers * 8))
+                    for rp_path_num, completed, match_stats, memo_stats in pool.imap(
+                        _complete_path_worker, path_nums[1:], chunksize=chunksize,
+                    ):
+                        to_ret[rp_path_num] = completed
+                        for key, count in match_stats.items():
+                            self.inchikey_match_stats[key] += count
+                        for key, count in memo_stats.items():
+                            self.step_memo_stats[key] += count
+                        progress.update()
+            finally:
+                _COMPLETION_DATA = None
+        else:
+            for rp_path_num in path_nums[1:]:
+                complete(rp_path_num)
+        progress.close()
         return to_ret
 
 
+    def _iter_rp2paths_groups(self, rp2paths_path: str, chunksize: int = 10000) -> Iterator[pd.DataFrame]:
+        """Read the rp2paths output in chunks and yield the rows of one Path ID at a time.
+
+        Groups are runs of consecutive rows sharing the same Path ID, as in `_read_rp2paths`.
+        Only the current chunk and the (possibly incomplete) last group are kept in memory.
+        The rows of a Path ID are therefore expected to be contiguous, as rp2paths writes them:
+        a Path ID whose rows are split by other Path IDs is yielded once per run of rows, and
+        a warning is logged for every run after the first one.
+
+        Args:
+            rp2paths_path (str): Path to the rp2paths pathway output CSV file.
+            chunksize (int): Number of rows read at once.
+
+        Yields:
+            pd.DataFrame: The rows of one Path ID. Nothing is yielded if the file cannot be
+            read or misses required columns.
+        """
+        import pandas as pd
+
+        try:
+            reader = pd.read_csv(rp2paths_path, chunksize=chunksize)
+        except FileNotFoundError:
+            logging.error(f"Cannot find file: {rp2paths_path}")
+            return
+        except OSError as e:
+            logging.error(f"Error reading {rp2paths_path}: {e}")
+            return
+        required_cols = {"Path ID", "Unique ID", "Rule ID", "Left", "Right"}
+        seen_path_ids = set()
+
+        def path_group(group):
+            path_id = group['Path ID'].iloc[0]
+            if path_id in seen_path_ids:
+                logging.warning(f"Rows of Path ID {path_id} are not contiguous in {rp2paths_path}, they are completed separately")
+            seen_path_ids.add(path_id)
+            return group.reset_index(drop=True)
+
+        pending = None
+        with reader:
+            for chunk in reader:
+                if pending is None and not required_cols.issubset(chunk.columns):
+                    logging.error(f"Missing required columns in {rp2paths_path}. Found: {list(chunk.columns)}")
+                    return
+                if pending is not None:
+                    chunk = pd.concat([pending, chunk], ignore_index=True)
+                if chunk.empty:
+                    continue
+                path_runs = (chunk['Path ID'] != chunk['Path ID'].shift()).cumsum()
+                is_last = path_runs == path_runs.iloc[-1]
+                for _, group in chunk[~is_last].groupby(path_runs[~is_last], sort=False):
+                    yield path_group(group)
+                pending = chunk[is_last]
+        if pending is not None and not pending.empty:
+            yield path_group(pending)
+
+
+    def iter_completed_paths(
+        self,
+        rp2paths_path: Optional[str] = None,
+        chunksize: int = 10000,
+        match_threshold: Optional[float] = None,
+    ) -> Iterator[Tuple[int, List[Dict[int, CompletedStep]]]]:
+        """Stream the completed pathways, one Path ID at a time.
+
+        This is the streaming equivalent of `completed_paths`: out_paths.csv is read in
+        chunks and each Path ID is parsed, enumerated and completed as soon as all its
+        rows are read, so memory is bounded by the largest pathway rather than by the file.
+        Path IDs that cannot be parsed are logged and skipped. The rows of every Path ID must
+        be contiguous: otherwise the Path ID is yielded once per run of rows (see
+        `_iter_rp2paths_groups`).
+
+        Args:
+            rp2paths_path (Optional[str]): Path to the rp2paths output. Defaults to the one given at construction.
+            chunksize (int): Number of rows of the CSV read at once.
+            match_threshold (Optional[float]): Defaults to ``match_strc_search_threshold``.
+
+        Yields:
+            Tuple[int, List[Dict[int, CompletedStep]]]: (path_id, completed subpaths)
+        """
+        rp2paths_path = rp2paths_path or self.rp2_paths_path
+        if match_threshold is None:
+            match_threshold = self.match_strc_search_threshold
+        for group in self._iter_rp2paths_groups(rp2paths_path, chunksize=chunksize):
+            rp_paths = self._rp2paths_from_df(group)
+            if rp_paths is False:
+                logging.error(f"Skipping path {group['Path ID'].iloc[0]}: cannot parse its rows")
+                continue
+            all_paths = self._extract_all_paths(rp_paths, match_threshold=match_threshold)
+            completed_paths = self._process_all_paths(all_paths, match_threshold=match_threshold, rp_paths=rp_paths)
+            yield from completed_paths.items()
+        self._log_match_stats()
+
+
+    def rp_paths_table(self, rp_paths: Optional[Dict[int, Any]] = None) -> pd.DataFrame:
+        """Return rp_paths as a table with one row per (path, step, rule, reaction, substrate, species).
+
+        For example, the pathways using a reaction are
+        ``df.loc[df['rule_mnxr'] == mnxr, 'path_id'].unique()`` and the rule score distribution
+        per step is ``df.drop_duplicates(['path_id', 'step', 'rule_id', 'rule_mnxr', 'rule_mnxm'])
+        .groupby('step')['rule_score'].describe()``. See ``metaxime.tables.rp_paths_to_table``.
+
+        Args:
+            rp_paths: Defaults to ``self.rp_paths``.
+
+        Returns:
+            pd.DataFrame: The table, with categorical identifiers.
+        """
+        return rp_paths_to_table(self.rp_paths if rp_paths is None else rp_paths)
+
+
+    def completed_paths_table(
+        self,
+        completed_paths: Optional[Dict[int, List[Dict[int, CompletedStep]]]] = None,
+        rp_paths: Optional[Dict[int, Any]] = None,
+    ) -> pd.DataFrame:
+        """Return completed_paths as a table with one row per (path, subpath, step, species).
+
+        See ``metaxime.tables.completed_paths_to_table``.
+
+        Args:
+            completed_paths: Defaults to ``self.completed_paths``.
+            rp_paths: The rp_paths providing the rule scores. Defaults to ``self.rp_paths``.
+
+        Returns:
+            pd.DataFrame: The table, with categorical identifiers.
+        """
+        return completed_paths_to_table(
+            self.completed_paths if completed_paths is None else completed_paths,
+            rp_paths=self.rp_paths if rp_paths is None else rp_paths,
+        )
+
+
+    def complete_paths_table(
+        self,
+        rp_paths_table: pd.DataFrame,
+        match_threshold: Optional[float] = None,
+    ) -> Dict[int, List[Dict[int, CompletedStep]]]:
+        """Enumerate and complete the subpaths of a (possibly filtered) table of ``rp_paths_table``.
+
+        Args:
+            rp_paths_table: The table, e.g. without the rows of some rules or reactions.
+            match_threshold: Defaults to ``match_strc_search_threshold``.
+
+        Returns:
+            Dict[int, List[Dict[int, CompletedStep]]]: The completed subpaths of every pathway of the table.
+        """
+        if match_threshold is None:
+            match_threshold = self.match_strc_search_threshold
+        rp_paths = rp_paths_from_table(rp_paths_table)
+        all_paths = self._extract_all_paths(rp_paths, match_threshold=match_threshold)
+        return self._process_all_paths(all_paths, match_threshold=match_threshold, rp_paths=rp_paths)
+
+
+    def _log_match_stats(self) -> None:
+        """Log the fingerprint cache, exact InChIKey match, pruning and step memo counters"""
+        logging.info(f'Fingerprint cache: {self.fp_cache.stats()}')
+        n_matches = sum(self.inchikey_match_stats.values())
+        if n_matches:
+            logging.info(
+                f"Exact InChIKey matches: {self.inchikey_match_stats['exact']}/{n_matches} "
+                f"({self.inchikey_match_stats['exact'] / n_matches:.1%} of structure matching skipped)"
+            )
+        if self.pruned_stats['steps']:
+            logging.info(
+                f"Pruned infeasible step choices: {self.pruned_stats['steps']} "
+                f"({self.pruned_stats['subpaths']} subpaths never enumerated)"
+            )
+        n_steps = sum(self.step_memo_stats.values())
+        if n_steps:
+            logging.info(
+                f"Memoized steps: {self.step_memo_stats['hits']}/{n_steps} "
+                f"({self.step_memo_stats['hits'] / n_steps:.1%} of step completions skipped)"
+            )
+
+
     def return_rp2_models(
         self,
         compartment_id: str = "c",
         extracellular_compartment_id: str = "e",
         reaction_lower_bound: float = 0.0,
         reaction_upper_bound: float = 1000.0,
+        completed_paths: Optional[Union[Dict[int, List[Dict[int, CompletedStep]]], pd.DataFrame]] = None,
     ) -> Dict[int, Dict[int, Model]]:
         """Build one COBRA model per (path_num, subpath) from RetroPath-like data.
 
@@ -767,140 +1651,211 @@ class ParserRP2(RR_Data):
             compartment_id: COBRA compartment ID to assign to created metabolites.
             reaction_lower_bound: Lower bound applied to every reaction.
             reaction_upper_bound: Upper bound applied to every reaction.
+            completed_paths: The completed subpaths, or a (possibly filtered) table of
+                ``completed_paths_table``. Defaults to ``self.completed_paths``.
 
         Returns:
             Dict mapping path_num -> {subpath_index -> cobra.Model}.
         """
+        if completed_paths is None:
+            completed_paths = self.completed_paths
+        elif not isinstance(completed_paths, dict):
+            completed_paths = completed_paths_from_table(completed_paths)
+        to_ret = {}
+        for rp_path_num in completed_paths:
+            to_ret[rp_path_num] = self._rp2_path_models(
+                rp_path_num,
+                completed_paths[rp_path_num],
+                compartment_id=compartment_id,
+                extracellular_compartment_id=extracellular_compartment_id,
+                reaction_lower_bound=reaction_lower_bound,
+                reaction_upper_bound=reaction_upper_bound,
+            )
+        return to_ret
+
+
+    def iter_rp2_models(
+        self,
+        compartment_id: str = "c",
+        extracellular_compartment_id: str = "e",
+        reaction_lower_bound: float = 0.0,
+        reaction_upper_bound: float = 1000.0,
+        chunksize: int = 10000,
+    ) -> Iterator[Tuple[int, Dict[int, Model]]]:
+        """Streaming equivalent of `return_rp2_models` built on `iter_completed_paths`.
+
+        Args:
+            compartment_id: COBRA compartment ID to assign to created metabolites.
+            reaction_lower_bound: Lower bound applied to every reaction.
+            reaction_upper_bound: Upper bound applied to every reaction.
+            chunksize: Number of rows of out_paths.csv read at once.
+
+        Yields:
+            Tuple[int, Dict[int, Model]]: (path_num, {subpath_index -> cobra.Model})
+        """
+        for rp_path_num, rp_subpaths in self.iter_completed_paths(chunksize=chunksize):
+            yield rp_path_num, self._rp2_path_models(
+                rp_path_num,
+                rp_subpaths,
+                compartment_id=compartment_id,
+                extracellular_compartment_id=extracellular_compartment_id,
+                reaction_lower_bound=reaction_lower_bound,
+                reaction_upper_bound=reaction_upper_bound,
+            )
+
+
+    def _rp2_path_models(
+        self,
+        rp_path_num: int,
+        rp_subpaths: List[Dict[int, CompletedStep]],
+        compartment_id: str = "c",
+        extracellular_compartment_id: str = "e",
+        reaction_lower_bound: float = 0.0,
+        reaction_upper_bound: float = 1000.0,
+    ) -> Dict[int, Model]:
+        """Build one COBRA model per completed subpath of a single pathway.
+
+        Args:
+            rp_path_num: The Path ID.
+            rp_subpaths: The completed subpaths of that pathway.
+            compartment_id: COBRA compartment ID to assign to created metabolites.
+            reaction_lower_bound: Lower bound applied to every reaction.
+            reaction_upper_bound: Upper bound applied to every reaction.
+
+        Returns:
+            Dict mapping subpath_index -> cobra.Model.
+        """
+        import pandas as pd
+        from cobra import Model, Reaction, Metabolite
+
+        logging.debug(f'------ {rp_path_num} -------')
         to_ret = {}
         # TODO: check the orientation of the reaction so that it matches the correct one
-        for rp_path_num in self.completed_paths:
-            logging.debug(f'------ {rp_path_num} -------')
-            to_ret[rp_path_num] = {}
-            for rp_subpath_num, rp_subpath in enumerate(self.completed_paths[rp_path_num]):
-                model = Model(f'rp2_{rp_path_num}_{rp_subpath_num}')
-                model_meta = {}
-                model_reac = []
-                target_meta_cid = None
-                for path_step in rp_subpath: #step in that enumarated path
-                    #print(rp_subpath[path_step])
-                    rp_rule = rp_subpath[path_step]['rule']
-                    rp_reactants = rp_subpath[path_step]['reactants']
-                    rp_products = rp_subpath[path_step]['products']
-                    # direction = rp_subpath[path_step]['direction']
-                    # if direction==1:
-                    #     rp_reactants = rp_subpath[path_step]['reactants']
-                    #     rp_products = rp_subpath[path_step]['products']
-                    # elif direction==-1:
-                    #     rp_reactants = rp_subpath[path_step]['products']
-                    #     rp_products = rp_subpath[path_step]['reactants']
-                    # else:
-                    #     logging.error('Cannot recognize the direction')
-                    #     break
-                    rp_rule_trans_id = rp_subpath[path_step]['transformation_id']
-                    #Reaction
-                    reaction = Reaction(rp_rule_trans_id)
-                    reaction.name = ''
-                    reaction.subsystem = ''
-                    reaction.lower_bound = reaction_lower_bound  
-                    reaction.upper_bound = reaction_upper_bound
-                    reaction.annotation.update({
-                        'rp_score': self.rp_scope.get(rp_rule_trans_id, {}).get('score', 0.0),
-                        'rp_step': path_step,
-                        'rp_id': rp_rule,
-                        'metanetx.reaction': rp_subpath[path_step].get('reaction', ''),
-                        #add the ec from out_scope
-                        'ec-code': self.rp_scope.get(rp_rule_trans_id, {}).get('ec-code', [])
-                    })
-                    #Metabolite
-                    logging.debug(rp_reactants|rp_products)
-                    for cid in rp_reactants|rp_products:
-                        if 'TARGET' in cid and not target_meta_cid:
-                            logging.info(f'Found target: {cid}')
-                            target_meta_cid = cid
-                        if not cid in model_meta:
-                            xref = self.rp_strc.get(cid, {}).get('xref')
-                            desc = self.rp_strc.get(cid, {}).get('desc')
-                            if not xref:
-                                try:
-                                    xref, _ = self.mnxm_xref(cid)
-                                    desc = {k: v for k, v in xref.items() if k != 'xref'}
-                                    xref = xref['xref']
-                                    if not 'inchi' in xref and 'InChI' in desc:
-                                        if not pd.isna(desc['InChI']):
-                                            xref['inchi'] = desc['InChI']
-                                    if not 'inchi_key' in xref and 'InChIKey' in desc:
-                                        if not pd.isna(desc['InChIKey']):
-                                            xref['inchi_key'] = desc['InChIKey']
-                                    if not 'smiles' in xref and 'SMILES' in desc:
-                                        if not pd.isna(desc['SMILES']):
-                                            xref['smiles'] = desc['SMILES']
-                                except KeyError:
-                                    xref =  {}
-                                    desc = {}
-                            model_meta[cid] = Metabolite(
-                                    f'{cid}_{compartment_id}',
-                                    formula=desc.get('formula', None),
-                                    name=desc.get('name', cid),
-                                    charge=desc.get('charge', 0.0),
-                                    compartment=compartment_id,
-                            )
-                            model_meta[cid].annotation.update(xref)
-                    model_reaction_dict = {}
-                    for cid in rp_products:
-                        model_reaction_dict[model_meta[cid]] = rp_products[cid]
-                    for cid in rp_reactants:
-                        model_reaction_dict[model_meta[cid]] = -rp_reactants[cid]
-                    reaction.add_metabolites(
-                        model_reaction_dict
-                    )
-                    model_reac.append(reaction)
-                #add a reaction that transports the target to extracellular if target
-                if not target_meta_cid:
-                    logging.warning('Did not find the target metabolite... skipping')
-                    break
-                transport_reaction = Reaction('transport_target')
-                transport_reaction.name = 'transport_target'
-                transport_reaction.subsystem = ''
-                transport_reaction.lower_bound = reaction_lower_bound  
-                transport_reaction.upper_bound = reaction_upper_bound
-                trans_target_meta = Metabolite(
-                        f'{target_meta_cid}_{extracellular_compartment_id}',
-                        formula=xref.get('formula', model_meta[target_meta_cid].annotation.get('formula')),
-                        name=xref.get('name', target_meta_cid),
-                        charge=xref.get('charge', model_meta[target_meta_cid].annotation.get('charge')),
-                        compartment=extracellular_compartment_id,
+        for rp_subpath_num, rp_subpath in enumerate(rp_subpaths):
+            model = Model(f'rp2_{rp_path_num}_{rp_subpath_num}')
+            model_meta = {}
+            model_reac = []
+            target_meta_cid = None
+            for path_step in rp_subpath: #step in that enumarated path
+                #print(rp_subpath[path_step])
+                rp_rule = rp_subpath[path_step].rule
+                rp_reactants = dict(rp_subpath[path_step].reactants)
+                rp_products = dict(rp_subpath[path_step].products)
+                # direction = rp_subpath[path_step]['direction']
+                # if direction==1:
+                #     rp_reactants = rp_subpath[path_step]['reactants']
+                #     rp_products = rp_subpath[path_step]['products']
+                # elif direction==-1:
+                #     rp_reactants = rp_subpath[path_step]['products']
+                #     rp_products = rp_subpath[path_step]['reactants']
+                # else:
+                #     logging.error('Cannot recognize the direction')
+                #     break
+                rp_rule_trans_id = rp_subpath[path_step].transformation_id
+                #Reaction
+                reaction = Reaction(rp_rule_trans_id)
+                reaction.name = ''
+                reaction.subsystem = ''
+                reaction.lower_bound = reaction_lower_bound  
+                reaction.upper_bound = reaction_upper_bound
+                reaction.annotation.update({
+                    'rp_score': self.rp_scope.get(rp_rule_trans_id, {}).get('score', 0.0),
+                    'rp_step': path_step,
+                    'rp_id': rp_rule,
+                    'metanetx.reaction': rp_subpath[path_step].reaction,
+                    #add the ec from out_scope
+                    'ec-code': self.rp_scope.get(rp_rule_trans_id, {}).get('ec-code', [])
+                })
+                #Metabolite
+                logging.debug(rp_reactants|rp_products)
+                for cid in rp_reactants|rp_products:
+                    if 'TARGET' in cid and not target_meta_cid:
+                        logging.info(f'Found target: {cid}')
+                        target_meta_cid = cid
+                    if not cid in model_meta:
+                        xref = self.rp_strc.get(cid, {}).get('xref')
+                        desc = self.rp_strc.get(cid, {}).get('desc')
+                        if not xref:
+                            try:
+                                xref, _ = self.mnxm_xref(cid)
+                                desc = {k: v for k, v in xref.items() if k != 'xref'}
+                                xref = xref['xref']
+                                if not 'inchi' in xref and 'InChI' in desc:
+                                    if not pd.isna(desc['InChI']):
+                                        xref['inchi'] = desc['InChI']
+                                if not 'inchi_key' in xref and 'InChIKey' in desc:
+                                    if not pd.isna(desc['InChIKey']):
+                                        xref['inchi_key'] = desc['InChIKey']
+                                if not 'smiles' in xref and 'SMILES' in desc:
+                                    if not pd.isna(desc['SMILES']):
+                                        xref['smiles'] = desc['SMILES']
+                            except KeyError:
+                                xref =  {}
+                                desc = {}
+                        model_meta[cid] = Metabolite(
+                                f'{cid}_{compartment_id}',
+                                formula=desc.get('formula', None),
+                                name=desc.get('name', cid),
+                                charge=desc.get('charge', 0.0),
+                                compartment=compartment_id,
+                        )
+                        model_meta[cid].annotation.update(xref)
+                model_reaction_dict = {}
+                for cid in rp_products:
+                    model_reaction_dict[model_meta[cid]] = rp_products[cid]
+                for cid in rp_reactants:
+                    model_reaction_dict[model_meta[cid]] = -rp_reactants[cid]
+                reaction.add_metabolites(
+                    model_reaction_dict
                 )
-                trans_target_meta.annotation.update(dict(model_meta[target_meta_cid].annotation))
-                trans_reaction_dict = {
-                        model_meta[target_meta_cid]: -1.0,
-                        trans_target_meta: 1.0,
-                }
-                transport_reaction.add_metabolites(trans_reaction_dict)
-                model_reac.append(transport_reaction)
-                #add a sink
-                sink_reaction = Reaction('sink_target')
-                sink_reaction.name = 'sink_target'
-                sink_reaction.subsystem = ''
-                sink_reaction.lower_bound = reaction_lower_bound  
-                sink_reaction.upper_bound = reaction_upper_bound
-                sink_reaction_dict = {
-                        trans_target_meta: -1.0
-                }
-                sink_reaction.add_metabolites(sink_reaction_dict)
-                model_reac.append(sink_reaction)
-                #add to model
-                model.add_reactions(model_reac)
-                #sanitize
-                for m in model.metabolites:
-                    try:
-                        int(m.charge)
-                    except (ValueError, TypeError) as e:
-                        m.charge = 0.0
-                for m in model.metabolites:
-                    if not isinstance(m.formula, str) or m.formula in ('nan', 'None', 'NaN', ''):
-                        m.formula = None
-                #TODO identify the source molecules and make sure they are all recognized - if not, ignore
-                to_ret[rp_path_num][rp_subpath_num] = model
+                model_reac.append(reaction)
+            #add a reaction that transports the target to extracellular if target
+            if not target_meta_cid:
+                logging.warning('Did not find the target metabolite... skipping')
+                break
+            transport_reaction = Reaction('transport_target')
+            transport_reaction.name = 'transport_target'
+            transport_reaction.subsystem = ''
+            transport_reaction.lower_bound = reaction_lower_bound  
+            transport_reaction.upper_bound = reaction_upper_bound
+            trans_target_meta = Metabolite(
+                    f'{target_meta_cid}_{extracellular_compartment_id}',
+                    formula=xref.get('formula', model_meta[target_meta_cid].annotation.get('formula')),
+                    name=xref.get('name', target_meta_cid),
+                    charge=xref.get('charge', model_meta[target_meta_cid].annotation.get('charge')),
+                    compartment=extracellular_compartment_id,
+            )
+            trans_target_meta.annotation.update(dict(model_meta[target_meta_cid].annotation))
+            trans_reaction_dict = {
+                    model_meta[target_meta_cid]: -1.0,
+                    trans_target_meta: 1.0,
+            }
+            transport_reaction.add_metabolites(trans_reaction_dict)
+            model_reac.append(transport_reaction)
+            #add a sink
+            sink_reaction = Reaction('sink_target')
+            sink_reaction.name = 'sink_target'
+            sink_reaction.subsystem = ''
+            sink_reaction.lower_bound = reaction_lower_bound  
+            sink_reaction.upper_bound = reaction_upper_bound
+            sink_reaction_dict = {
+                    trans_target_meta: -1.0
+            }
+            sink_reaction.add_metabolites(sink_reaction_dict)
+            model_reac.append(sink_reaction)
+            #add to model
+            model.add_reactions(model_reac)
+            #sanitize
+            for m in model.metabolites:
+                try:
+                    int(m.charge)
+                except (ValueError, TypeError) as e:
+                    m.charge = 0.0
+            for m in model.metabolites:
+                if not isinstance(m.formula, str) or m.formula in ('nan', 'None', 'NaN', ''):
+                    m.formula = None
+            #TODO identify the source molecules and make sure they are all recognized - if not, ignore
+            to_ret[rp_subpath_num] = model
         return to_ret
 
 
@@ -950,6 +1905,8 @@ class ParserRP2(RR_Data):
             >>> any(data["type"] == "reaction" for _, data in G.nodes(data=True))
             True
         """
+        import networkx as nx
+
         G = nx.DiGraph()
         # Add metabolite nodes
         for met in model.metabolites:
@@ -0,0 +1,348 @@
+from collections import OrderedDict
+from typing import Dict, Tuple, Any, Optional, Iterable, Iterator, List
+
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+
+from .store import _json_default, _MISSING
+
+#: Environment variable holding the UNIX socket of the reference-data service
+SOCKET_ENV = 'METAXIME_REFERENCE_SOCKET'
+
+#: Tables of RR_Data served by key
+REFERENCE_TABLES = ('mnxm_prop', 'mnxr_prop', 'inchikey_mnxm', 'inchikey2_mnxm')
+#: Small attributes of RR_Data served whole
+REFERENCE_ATTRS = ('mnxm_cofactors',)
+#: Methods of RR_Data served by call
+REFERENCE_METHODS = ('mnxm_xref', 'single_depr_mnxm', 'single_depr_mnxr')
+
+# Exceptions that are raised again on the client side, others become RuntimeError
+_ERRORS = {'KeyError': KeyError, 'ValueError': ValueError, 'TypeError': TypeError}
+
+# Keys of the JSON objects standing for the tuples and sets of the messages
+_TUPLE = '__tuple__'
+_SET = '__set__'
+
+
+def _encode(value: Any) -> Any:
+    """Replace the tuples and sets of a value, which JSON would turn into lists, by tagged objects"""
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, tuple):
+        return {_TUPLE: [_encode(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {_SET: [_encode(item) for item in value]}
+    return value
+
+
+def _decode_object(obj: Dict[str, Any]) -> Any:
+    """Restore the tuples and sets tagged by ``_encode`` (``json.loads`` object hook)"""
+    if len(obj) == 1:
+        if _TUPLE in obj:
+            return tuple(obj[_TUPLE])
+        if _SET in obj:
+            return set(obj[_SET])
+    return obj
+
+
+def _dumps(message: Dict[str, Any]) -> bytes:
+    """Serialize a request or response to one line of JSON"""
+    return json.dumps(_encode(message), default=_json_default).encode() + b'\n'
+
+
+def _loads(line: bytes) -> Dict[str, Any]:
+    """Deserialize a line of ``_dumps``"""
+    return json.loads(line, object_hook=_decode_object)
+
+
+class _ReferenceDataHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                response = _dumps({'result': self.server.dispatch(_loads(line))})
+            except Exception as e:
+                # also reports the results that cannot be serialized, instead of closing the connection
+                key = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+                response = _dumps({'error': type(e).__name__, 'message': key})
+            self.wfile.write(response)
+            self.wfile.flush()
+
+
+class ReferenceDataServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, data: Any):
+        """Long-lived service holding the reference tables of a RR_Data instance in memory
+
+        Requests and responses are JSON objects, one per line, over a UNIX socket, in which
+        tuples and sets are tagged so that they are received as such (see ``_encode``):
+            - ``{"op": "ping"}``: returns the cache stamp of the served data
+            - ``{"op": "get_many", "table": ..., "keys": [...]}``: returns the found keys and their values
+            - ``{"op": "keys", "table": ...}``: returns all the keys of a table
+            - ``{"op": "len", "table": ...}``: returns the number of entries of a table
+            - ``{"op": "attr", "name": ...}``: returns a small attribute whole
+            - ``{"op": "call", "method": ..., "args": [...], "kwargs": {...}}``: returns the result of a method
+
+        Args:
+            socket_path: Path of the UNIX socket. A stale socket file is replaced.
+            data: The RR_Data instance to serve. Its tables are loaded by ``preload``.
+        """
+        self.data = data
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _ReferenceDataHandler)
+
+    def preload(self) -> None:
+        """Load every served table so that the first requests are not slowed down"""
+        for name in REFERENCE_TABLES + REFERENCE_ATTRS:
+            logging.info(f'Loading {name}')
+            getattr(self.data, name)
+
+    def dispatch(self, request: Dict[str, Any]) -> Any:
+        op = request.get('op')
+        if op == 'ping':
+            from .cache_data import cache_stamp
+            return cache_stamp()
+        if op in ('get_many', 'keys', 'len'):
+            if request['table'] not in REFERENCE_TABLES:
+                raise ValueError(f"Unknown table: {request['table']}")
+            table = getattr(self.data, request['table'])
+            if op == 'keys':
+                return list(table)
+            if op == 'len':
+                return len(table)
+            return {key: table[key] for key in request['keys'] if key in table}
+        if op == 'attr':
+            if request['name'] not in REFERENCE_ATTRS:
+                raise ValueError(f"Unknown attribute: {request['name']}")
+            return list(getattr(self.data, request['name']))
+        if op == 'call':
+            if request['method'] not in REFERENCE_METHODS:
+                raise ValueError(f"Unknown method: {request['method']}")
+            return getattr(self.data, request['method'])(*request.get('args', []), **request.get('kwargs', {}))
+        raise ValueError(f'Unknown operation: {op}')
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def serve(socket_path: str, use_progressbar: bool = False) -> None:
+    """Load the reference data and serve it on a UNIX socket until interrupted or terminated
+
+    Args:
+        socket_path: Path of the UNIX socket.
+        use_progressbar: Show progress bars while loading.
+    """
+    from .cache_data import RR_Data
+
+    data = RR_Data(use_progressbar=use_progressbar, reference_socket=False)
+    # exit through the context manager on SIGTERM so that the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with ReferenceDataServer(socket_path, data) as server:
+        server.preload()
+        logging.info(f'Serving the reference data on {socket_path}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+class ReferenceDataClient:
+    def __init__(self, socket_path: str, cache_size: int = 4096, timeout: Optional[float] = 60.0):
+        """Client of a ``ReferenceDataServer``
+
+        The connection is opened lazily, re-opened in forked child processes and shared
+        between the threads of a process.
+
+        Args:
+            socket_path: Path of the UNIX socket of the service.
+            cache_size: Number of entries kept in the LRU cache of each table.
+            timeout: Socket timeout in seconds.
+        """
+        self.socket_path = socket_path
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._rfile = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._tables: Dict[str, 'RemoteTable'] = {}
+        self._attrs: Dict[str, Any] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {'socket_path': self.socket_path, 'cache_size': self.cache_size, 'timeout': self.timeout}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state['socket_path'], cache_size=state['cache_size'], timeout=state['timeout'])
+
+    @classmethod
+    def connect(cls, socket_path: Optional[str] = None, **kwargs) -> Optional['ReferenceDataClient']:
+        """Return a client if a service answers on the socket, None otherwise
+
+        Args:
+            socket_path: Path of the UNIX socket. Defaults to the ``METAXIME_REFERENCE_SOCKET`` environment variable.
+            kwargs: Passed to ``ReferenceDataClient``.
+
+        Returns:
+            Optional[ReferenceDataClient]: The connected client, or None if no service is available
+            or it serves data built from other inputs.
+        """
+        socket_path = socket_path or os.environ.get(SOCKET_ENV)
+        if not socket_path or not os.path.exists(socket_path):
+            return None
+        from .cache_data import cache_stamp
+
+        client = cls(socket_path, **kwargs)
+        try:
+            stamp = client.request({'op': 'ping'})
+        except (OSError, ValueError, RuntimeError) as e:
+            logging.warning(f'Reference-data service on {socket_path} is not available: {e}')
+            return None
+        if stamp != cache_stamp():
+            logging.warning(f'Reference-data service on {socket_path} serves other data, loading it in process')
+            return None
+        logging.info(f'Using the reference-data service on {socket_path}')
+        return client
+
+    def _connection(self):
+        if self._sock is None or self._pid != os.getpid():
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(self.timeout)
+            self._sock.connect(self.socket_path)
+            self._rfile = self._sock.makefile('rb')
+            self._pid = os.getpid()
+        return self._sock, self._rfile
+
+    def close(self) -> None:
+        if self._sock is not None and self._pid == os.getpid():
+            self._rfile.close()
+            self._sock.close()
+        self._sock = None
+        self._rfile = None
+
+    def request(self, request: Dict[str, Any]) -> Any:
+        """Send a request to the service and return its result, raising its errors"""
+        with self._lock:
+            sock, rfile = self._connection()
+            try:
+                sock.sendall(_dumps(request))
+                line = rfile.readline()
+            except OSError:
+                self.close()
+                raise
+            if not line:
+                self.close()
+                raise ConnectionError(f'Reference-data service on {self.socket_path} closed the connection')
+        response = _loads(line)
+        if 'error' in response:
+            raise _ERRORS.get(response['error'], RuntimeError)(response['message'])
+        return response['result']
+
+    def table(self, name: str) -> 'RemoteTable':
+        """Return a read-only mapping view of a table of the service"""
+        if name not in self._tables:
+            self._tables[name] = RemoteTable(self, name, cache_size=self.cache_size)
+        return self._tables[name]
+
+    def attr(self, name: str) -> Any:
+        """Return a small attribute of the service, fetched once"""
+        if name not in self._attrs:
+            self._attrs[name] = set(self.request({'op': 'attr', 'name': name}))
+        return self._attrs[name]
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        """Call a method of the served RR_Data instance"""
+        return self.request({'op': 'call', 'method': method, 'args': args, 'kwargs': kwargs})
+
+
+class RemoteTable:
+    #: Number of keys per "get_many" request
+    batch_size = 10000
+
+    def __init__(self, client: ReferenceDataClient, name: str, cache_size: int = 4096):
+        """Read-only mapping over a table of a ``ReferenceDataServer``
+
+        Same interface as ``SQLiteStore``: only the requested entries are transferred and
+        the most recently used ones (and missing keys) are kept in a small LRU cache.
+
+        Args:
+            client: The client of the service.
+            name: Name of the table (see ``REFERENCE_TABLES``).
+            cache_size: Number of entries kept in the LRU cache. 0 disables it.
+        """
+        self.client = client
+        self.name = name
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+
+    def _cache_put(self, key: str, value: Any) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __len__(self) -> int:
+        return self.client.request({'op': 'len', 'table': self.name})
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def keys(self) -> Iterator[str]:
+        """Iterate over all the keys of the table"""
+        return iter(self.client.request({'op': 'keys', 'table': self.name}))
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Iterate over all the entries of the table, transferred in batches"""
+        keys = list(self.keys())
+        for i in range(0, len(keys), self.batch_size):
+            values = self.client.request({'op': 'get_many', 'table': self.name, 'keys': keys[i:i + self.batch_size]})
+            yield from values.items()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the value of a key, or ``default`` if it is not in the table"""
+        try:
+            value = self._cache[key]
+            self._cache.move_to_end(key)
+        except KeyError:
+            value = self.client.request({'op': 'get_many', 'table': self.name, 'keys': [key]}).get(key, _MISSING)
+            self._cache_put(key, value)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the values of several keys in as few requests as possible"""
+        to_ret: Dict[str, Any] = {}
+        to_fetch: List[str] = []
+        for key in dict.fromkeys(keys):
+            if key in self._cache:
+                if self._cache[key] is not _MISSING:
+                    to_ret[key] = self._cache[key]
+            else:
+                to_fetch.append(key)
+        for i in range(0, len(to_fetch), self.batch_size):
+            chunk = to_fetch[i:i + self.batch_size]
+            values = self.client.request({'op': 'get_many', 'table': self.name, 'keys': chunk})
+            for key in chunk:
+                self._cache_put(key, values.get(key, _MISSING))
+            to_ret.update(values)
+        return to_ret
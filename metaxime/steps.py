@@ -0,0 +1,59 @@
+import sys
+
+from dataclasses import dataclass
+from typing import Dict, Tuple, Any, Mapping
+
+#: (species id, stoichiometric coefficient) pairs of one side of a reaction
+Stoichiometry = Tuple[Tuple[str, float], ...]
+
+
+def intern_stoichiometry(species: Mapping[str, float]) -> Stoichiometry:
+    """Convert a {species id: coefficient} dict to ``Stoichiometry``, interning the ids"""
+    return tuple((sys.intern(str(mid)), coeff) for mid, coeff in species.items())
+
+
+@dataclass(frozen=True, slots=True)
+class Step:
+    """One (rule, reaction, substrate) choice of a pathway step
+
+    Records are immutable and hashable: the subpaths of a pathway share the records
+    of their steps (see ``ParserRP2._step_choices``).
+    """
+    rule: str
+    reaction: str
+    substrate: str
+
+    @classmethod
+    def interned(cls, rule: str, reaction: str, substrate: str) -> 'Step':
+        """Return a record whose identifiers are interned, i.e. shared with every other record using them"""
+        return cls(sys.intern(str(rule)), sys.intern(str(reaction)), sys.intern(str(substrate)))
+
+    def as_dict(self) -> Dict[str, str]:
+        """Return the step as {"rule": str, "reaction": str, "substrate": str}"""
+        return {'rule': self.rule, 'reaction': self.reaction, 'substrate': self.substrate}
+
+
+@dataclass(frozen=True, slots=True)
+class CompletedStep:
+    """A step completed with the missing species of its reaction recipe
+
+    Records are immutable, so that the subpaths sharing a suffix share its completed steps
+    (see ``ParserRP2._complete_subpaths``).
+    """
+    rule: str
+    reaction: str
+    substrate: str
+    transformation_id: str
+    reactants: Stoichiometry
+    products: Stoichiometry
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the step as a dict, with the reactants and products as {species id: coefficient}"""
+        return {
+            'rule': self.rule,
+            'reaction': self.reaction,
+            'substrate': self.substrate,
+            'transformation_id': self.transformation_id,
+            'reactants': dict(self.reactants),
+            'products': dict(self.products),
+        }
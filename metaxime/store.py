@@ -0,0 +1,193 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Tuple, Any, Optional, Iterable, Iterator, List
+
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+
+
+def _json_default(obj: Any) -> Any:
+    """Convert numpy scalars and arrays to JSON serializable values
+
+    Raises:
+        TypeError: If the object is of any other type, rather than storing something else.
+    """
+    # numpy is not imported just to check the type
+    if type(obj).__module__ == 'numpy' and hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+_MISSING = object()
+
+
+class SQLiteStore:
+    #: Maximum number of keys per "IN (...)" query (SQLite variable limit)
+    max_query_keys = 900
+
+    def __init__(self, path: str, cache_size: int = 4096):
+        """Read-only on-disk key -> JSON value store backed by SQLite
+
+        Only the requested entries are read from disk and decoded, so a large
+        table can be queried without materializing it in memory. The most
+        recently used entries (and missing keys) are kept in a small in-process
+        LRU cache. Decoded values are shared between lookups and should not be
+        modified in place.
+
+        The connection is opened lazily and re-opened in forked child processes.
+
+        Args:
+            path: Path to the SQLite file (see ``SQLiteStore.build``).
+            cache_size: Number of entries kept in the LRU cache. 0 disables it.
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {'path': self.path, 'cache_size': self.cache_size}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state['path'], cache_size=state['cache_size'])
+
+    def _cache_put(self, key: str, value: Any) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        """Return True if the store file exists"""
+        return os.path.exists(path)
+
+    @classmethod
+    def build(
+        cls,
+        path: str,
+        items: Iterable[Tuple[str, Any]],
+        batch_size: int = 10000,
+    ) -> "SQLiteStore":
+        """Write (key, value) pairs to a new store.
+
+        The store is written to a temporary file that is atomically renamed to
+        ``path`` once complete, so readers never see a partial store.
+
+        Args:
+            path: Path to the SQLite file.
+            items: (key, value) pairs. Values must be JSON serializable.
+            batch_size: Number of rows inserted per transaction.
+
+        Returns:
+            SQLiteStore: The store.
+        """
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute('CREATE TABLE store (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            batch: List[Tuple[str, str]] = []
+            count = 0
+            for key, value in items:
+                batch.append((str(key), json.dumps(value, default=_json_default)))
+                if len(batch) >= batch_size:
+                    conn.executemany('INSERT OR REPLACE INTO store VALUES (?, ?)', batch)
+                    count += len(batch)
+                    batch = []
+            conn.executemany('INSERT OR REPLACE INTO store VALUES (?, ?)', batch)
+            count += len(batch)
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+        logging.debug(f'Wrote {count} entries to {path}')
+        return cls(path)
+
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM store').fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def keys(self) -> Iterator[str]:
+        """Iterate over all the keys of the store"""
+        for (key,) in self.conn.execute('SELECT key FROM store'):
+            yield key
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the value of a key, or ``default`` if it is not in the store"""
+        try:
+            value = self._cache[key]
+            self._cache.move_to_end(key)
+        except KeyError:
+            row = self.conn.execute('SELECT value FROM store WHERE key = ?', (key,)).fetchone()
+            value = _MISSING if row is None else json.loads(row[0])
+            self._cache_put(key, value)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the values of several keys with as few queries as possible.
+
+        Args:
+            keys: Keys to fetch. Keys that are not in the store are ignored.
+
+        Returns:
+            Dict[str, Any]: The found keys and their values.
+        """
+        to_ret: Dict[str, Any] = {}
+        to_fetch: List[str] = []
+        for key in dict.fromkeys(keys):
+            if key in self._cache:
+                if self._cache[key] is not _MISSING:
+                    to_ret[key] = self._cache[key]
+            else:
+                to_fetch.append(key)
+        for i in range(0, len(to_fetch), self.max_query_keys):
+            chunk = to_fetch[i:i + self.max_query_keys]
+            query = f"SELECT key, value FROM store WHERE key IN ({','.join('?' * len(chunk))})"
+            for key, value in self.conn.execute(query, chunk):
+                to_ret[key] = json.loads(value)
+                self._cache_put(key, to_ret[key])
+        return to_ret
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Hold an exclusive lock on ``<path>.lock`` for the duration of the context.
+
+    Used so that concurrent processes starting on a cold cache build it once:
+    the first one builds while the others wait, then find it already built.
+
+    Args:
+        path: Path of the file to protect.
+    """
+    with open(f'{path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+from typing import Dict, Tuple, Any, Optional, List, TYPE_CHECKING
+
+from .steps import CompletedStep, intern_stoichiometry
+
+# pandas is imported on first use, like in metaxime.utils
+if TYPE_CHECKING:
+    import pandas as pd
+
+#: Columns of the table returned by ``rp_paths_to_table``
+RP_PATHS_COLUMNS = (
+    'path_id', 'step', 'rule_id', 'rule_mnxr', 'rule_mnxm', 'rule_score',
+    'transformation_id', 'side', 'species', 'stoichiometry',
+)
+#: Columns of the table returned by ``completed_paths_to_table``
+COMPLETED_PATHS_COLUMNS = (
+    'path_id', 'subpath', 'step', 'rule_id', 'rule_mnxr', 'rule_mnxm', 'rule_score',
+    'transformation_id', 'side', 'species', 'stoichiometry',
+)
+# Identifier columns, stored as categoricals
+_CATEGORICAL_COLUMNS = ('rule_id', 'rule_mnxr', 'rule_mnxm', 'transformation_id', 'side', 'species')
+
+
+def _to_frame(columns: Dict[str, List[Any]]) -> 'pd.DataFrame':
+    """Build a table with categorical identifiers and the smallest numeric types"""
+    import pandas as pd
+
+    df = pd.DataFrame(columns)
+    for col in df.columns:
+        if col in _CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif col in ('path_id', 'subpath', 'step'):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        elif col == 'stoichiometry':
+            # integer coefficients stay integers
+            df[col] = pd.to_numeric(df[col], downcast='integer' if (df[col] % 1 == 0).all() else 'float')
+        else:
+            df[col] = pd.to_numeric(df[col])
+    return df
+
+
+def rp_paths_to_table(rp_paths: Dict[int, Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]]) -> 'pd.DataFrame':
+    """Flatten rp_paths into a table with one row per (path, step, rule, reaction, substrate, species)
+
+    The identifiers are categoricals, so that bulk queries (e.g. the pathways using a given
+    reaction, the score distribution per step) are vectorized. Choices with no species on
+    either side have no row.
+
+    Args:
+        rp_paths: rp_paths[path_id][step][rule_id][reaction_id][substrate_id] -> {...} (see ``ParserRP2._read_rp2paths``)
+
+    Returns:
+        pd.DataFrame: The table, with the columns ``RP_PATHS_COLUMNS``. ``side`` is "left" or "right".
+    """
+    columns: Dict[str, List[Any]] = {col: [] for col in RP_PATHS_COLUMNS}
+    for path_id, steps_dict in rp_paths.items():
+        for step, rule_dict in steps_dict.items():
+            for rule_id, react_dict in rule_dict.items():
+                for react_id, sub_dict in react_dict.items():
+                    for sub_id, step_io in sub_dict.items():
+                        score = step_io.get('rule_score')
+                        for side in ('left', 'right'):
+                            for species, coeff in step_io[side].items():
+                                columns['path_id'].append(path_id)
+                                columns['step'].append(step)
+                                columns['rule_id'].append(rule_id)
+                                columns['rule_mnxr'].append(react_id)
+                                columns['rule_mnxm'].append(sub_id)
+                                columns['rule_score'].append(score)
+                                columns['transformation_id'].append(step_io['transformation_id'])
+                                columns['side'].append(side)
+                                columns['species'].append(species)
+                                columns['stoichiometry'].append(coeff)
+    return _to_frame(columns)
+
+
+def rp_paths_from_table(df: 'pd.DataFrame') -> Dict[int, Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]]:
+    """Rebuild rp_paths from a (possibly filtered) table of ``rp_paths_to_table``
+
+    Args:
+        df: The table, with at least the columns ``RP_PATHS_COLUMNS``.
+
+    Returns:
+        Dict: rp_paths[path_id][step][rule_id][reaction_id][substrate_id] -> {...}, in the order of the rows.
+    """
+    rp_paths: Dict[int, Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]] = {}
+    rows = zip(*(df[col].tolist() for col in RP_PATHS_COLUMNS))
+    for path_id, step, rule_id, react_id, sub_id, score, transformation_id, side, species, coeff in rows:
+        sub_dict = rp_paths.setdefault(path_id, {}).setdefault(step, {}).setdefault(rule_id, {}).setdefault(react_id, {})
+        if sub_id not in sub_dict:
+            sub_dict[sub_id] = {
+                "rule_id": rule_id,
+                "rule_mnxr": react_id,
+                "rule_mnxm": sub_id,
+                "rule_score": score,
+                "right": {},
+                "left": {},
+                "path_id": path_id,
+                "step": step,
+                "transformation_id": transformation_id,
+            }
+        sub_dict[sub_id][side][species] = coeff
+    return rp_paths
+
+
+def completed_paths_to_table(
+        completed_paths: Dict[int, List[Dict[int, CompletedStep]]],
+        rp_paths: Optional[Dict[int, Dict[int, Dict[str, Dict[str, Dict[str, Any]]]]]] = None,
+    ) -> 'pd.DataFrame':
+    """Flatten completed_paths into a table with one row per (path, subpath, step, species)
+
+    Args:
+        completed_paths: {path_id: [{step: CompletedStep}, ...]} (see ``ParserRP2._process_all_paths``)
+        rp_paths: The rp_paths the subpaths were completed from, to fill ``rule_score`` (NaN otherwise).
+
+    Returns:
+        pd.DataFrame: The table, with the columns ``COMPLETED_PATHS_COLUMNS``. ``subpath`` is the index
+        of the subpath in its pathway and ``side`` is "reactants" or "products".
+    """
+    rp_paths = rp_paths or {}
+    columns: Dict[str, List[Any]] = {col: [] for col in COMPLETED_PATHS_COLUMNS}
+    for path_id, rp_subpaths in completed_paths.items():
+        for subpath, rp_subpath in enumerate(rp_subpaths):
+            for step, completed in rp_subpath.items():
+                try:
+                    score = rp_paths[path_id][step][completed.rule][completed.reaction][completed.substrate].get('rule_score')
+                except KeyError:
+                    score = None
+                for side in ('reactants', 'products'):
+                    for species, coeff in getattr(completed, side):
+                        columns['path_id'].append(path_id)
+                        columns['subpath'].append(subpath)
+                        columns['step'].append(step)
+                        columns['rule_id'].append(completed.rule)
+                        columns['rule_mnxr'].append(completed.reaction)
+                        columns['rule_mnxm'].append(completed.substrate)
+                        columns['rule_score'].append(score)
+                        columns['transformation_id'].append(completed.transformation_id)
+                        columns['side'].append(side)
+                        columns['species'].append(species)
+                        columns['stoichiometry'].append(coeff)
+    return _to_frame(columns)
+
+
+def completed_paths_from_table(df: 'pd.DataFrame') -> Dict[int, List[Dict[int, CompletedStep]]]:
+    """Rebuild completed_paths from a (possibly filtered) table of ``completed_paths_to_table``
+
+    The subpaths of every pathway are listed in increasing ``subpath`` order, and so are
+    renumbered when some of them are filtered out. Identical steps share one record.
+
+    Args:
+        df: The table, with at least the columns ``COMPLETED_PATHS_COLUMNS``.
+
+    Returns:
+        Dict[int, List[Dict[int, CompletedStep]]]: {path_id: [{step: CompletedStep}, ...]}
+    """
+    steps: Dict[Tuple[int, int, int], Tuple[Tuple[str, str, str, str], Dict[str, Dict[str, Any]]]] = {}
+    cols = [col for col in COMPLETED_PATHS_COLUMNS if col != 'rule_score']
+    for path_id, subpath, step, rule_id, react_id, sub_id, transformation_id, side, species, coeff in zip(
+        *(df[col].tolist() for col in cols)
+    ):
+        key = (path_id, subpath, step)
+        if key not in steps:
+            steps[key] = ((rule_id, react_id, sub_id, transformation_id), {'reactants': {}, 'products': {}})
+        steps[key][1][side][species] = coeff
+    records: Dict[Tuple, CompletedStep] = {}
+    subpaths: Dict[int, Dict[int, Dict[int, CompletedStep]]] = {}
+    for (path_id, subpath, step), (ids, sides) in steps.items():
+        fields = ids + (intern_stoichiometry(sides['reactants']), intern_stoichiometry(sides['products']))
+        if fields not in records:
+            records[fields] = CompletedStep(*fields)
+        subpaths.setdefault(path_id, {}).setdefault(subpath, {})[step] = records[fields]
+    return {
+        path_id: [rp_subpaths[subpath] for subpath in sorted(rp_subpaths)]
+        for path_id, rp_subpaths in subpaths.items()
+    }
@@ -1,25 +1,35 @@
-from rdkit.Chem import MolFromSmiles, MolFromInchi, MolToSmiles, MolToInchi
-from rdkit.Chem.inchi import MolToInchiKey
+from __future__ import annotations
 
 from typing import Dict, Tuple, Any, Optional, Iterable, Literal, Set, Union, List
-from typing import Callable, Dict, Any, Mapping, Optional
+from typing import Callable, Dict, Any, Mapping, Optional, Iterator, TYPE_CHECKING
 from typing import Dict, Tuple, Optional
 
+import functools
 import logging
 import os
 import tarfile
-import pandas as pd
-import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
-from cobra import Model, Reaction, Metabolite
+# pandas, cobra, networkx and RDKit are imported on first use to keep the import of metaxime fast
+if TYPE_CHECKING:
+    import pandas as pd
+    from cobra import Model
 
 
-##### Merge
+@functools.lru_cache(maxsize=None)
+def load_rdkit():
+    """Import RDKit on first use and silence its warning messages
+
+    Returns:
+        module: rdkit.Chem
+    """
+    from rdkit import Chem, RDLogger
+    lg = RDLogger.logger()
+    lg.setLevel(RDLogger.CRITICAL)   # only show critical messages
+    return Chem
 
-from cobra import Model, Reaction, Metabolite
-from typing import Dict
 
-import networkx as nx
+##### Merge
 
 def cobra_to_bipartite_graph(model):
     """
@@ -28,6 +38,8 @@ def cobra_to_bipartite_graph(model):
 
     Edges store stoichiometry and direction.
     """
+    import networkx as nx
+
     G = nx.DiGraph()
 
     for rxn in model.reactions:
@@ -138,6 +150,8 @@ def merge_models(
         raise ValueError(f'Not all parentless metabolites are found: {parentless}')
 
     # Copy reactions with mapped metabolites
+    from cobra import Reaction
+
     new_reactions = []
     for r in source_model.reactions:
         reaction = Reaction(r.id)
@@ -165,86 +179,220 @@ def merge_models(
 
 #### convert
 
-def convert_depiction(
-    idepic: str,
-    itype: Literal["smiles", "inchi"] = "smiles",
-    otype: Iterable[str] = ("inchikey",),
-) -> Dict[str, str]:
-    """Convert a chemical depiction to one or more other formats using RDKit.
+SUPPORTED_DEPICTIONS = {"smiles", "inchi", "inchikey"}
 
-    Args:
-        idepic: Input depiction string (SMILES or InChI).
-        itype: Type of the input depiction, either "smiles" or "inchi".
-        otype: Iterable of desired output types. Any of {"smiles", "inchi", "inchikey"}.
 
-    Returns:
-        Dict[str, str]: A mapping from requested output types to their string values.
+def _check_depiction_types(itype: str, otypes: Set[str]) -> None:
+    """Validate the input and output depiction types.
 
     Raises:
         NotImplementedError: If `itype` or any requested output type is unsupported.
-        TypeError: If the input cannot be parsed into an RDKit molecule.
-        ValueError: If `otype` is empty.
+        ValueError: If `otypes` is empty.
     """
-    logging.debug(f"input: {idepic}")
-    logging.debug(f"itype: {itype}")
-    otypes: Set[str] = set(otype)
     if not otypes:
         raise ValueError("`otype` must contain at least one output type.")
+    if itype not in ("smiles", "inchi"):
+        raise NotImplementedError(f'"{itype}" is not a valid input type (use "smiles" or "inchi").')
+    unknown = otypes - SUPPORTED_DEPICTIONS
+    if unknown:
+        raise NotImplementedError(f"Unsupported output type(s): {sorted(unknown)}. "
+                                  f"Supported: {sorted(SUPPORTED_DEPICTIONS)}")
+
+
+def _depict(idepic: str, itype: str, otypes: Set[str]) -> Dict[str, str]:
+    """Parse a depiction once and export it to all the requested output types.
+
+    Raises:
+        TypeError: If the input cannot be parsed into an RDKit molecule.
+    """
+    Chem = load_rdkit()
+    from rdkit.Chem.inchi import MolToInchiKey
     # Import
     if itype == "smiles":
-        rdmol = MolFromSmiles(idepic, sanitize=True)
-    elif itype == "inchi":
-        rdmol = MolFromInchi(idepic, sanitize=True)
+        rdmol = Chem.MolFromSmiles(idepic, sanitize=True)
     else:
-        raise NotImplementedError(f'"{itype}" is not a valid input type (use "smiles" or "inchi").')
+        rdmol = Chem.MolFromInchi(idepic, sanitize=True)
     if rdmol is None:
         raise TypeError(f'Failed to parse depiction "{idepic}" of type "{itype}".')
     logging.debug("Sanitized the input molecule")
     # Export
-    supported = {"smiles", "inchi", "inchikey"}
-    unknown = otypes - supported
-    if unknown:
-        raise NotImplementedError(f"Unsupported output type(s): {sorted(unknown)}. "
-                                  f"Supported: {sorted(supported)}")
     out: Dict[str, str] = {}
     if "smiles" in otypes:
         # canonical SMILES by default
-        out["smiles"] = MolToSmiles(rdmol)
+        out["smiles"] = Chem.MolToSmiles(rdmol)
     if "inchi" in otypes:
-        out["inchi"] = MolToInchi(rdmol)
+        out["inchi"] = Chem.MolToInchi(rdmol)
     if "inchikey" in otypes:
         out["inchikey"] = MolToInchiKey(rdmol)
     logging.debug("Exported the requested output depictions")
     return out
 
 
-def read_compressed_tsv(file_path: str) -> pd.DataFrame:
-    """Load a TSV file of reaction recipes, supporting plain or tar.gz formats.
+def convert_depiction(
+    idepic: str,
+    itype: Literal["smiles", "inchi"] = "smiles",
+    otype: Iterable[str] = ("inchikey",),
+) -> Dict[str, str]:
+    """Convert a chemical depiction to one or more other formats using RDKit.
 
     Args:
-        file_path (str): Path to the .tsv or .tar.gz file containing the TSV.
+        idepic: Input depiction string (SMILES or InChI).
+        itype: Type of the input depiction, either "smiles" or "inchi".
+        otype: Iterable of desired output types. Any of {"smiles", "inchi", "inchikey"}.
+
+    Returns:
+        Dict[str, str]: A mapping from requested output types to their string values.
+
+    Raises:
+        NotImplementedError: If `itype` or any requested output type is unsupported.
+        TypeError: If the input cannot be parsed into an RDKit molecule.
+        ValueError: If `otype` is empty.
+    """
+    logging.debug(f"input: {idepic}")
+    logging.debug(f"itype: {itype}")
+    otypes: Set[str] = set(otype)
+    _check_depiction_types(itype, otypes)
+    return _depict(idepic, itype, otypes)
+
+
+def _convert_depictions_chunk(
+    idepics: List[str],
+    itype: str,
+    otypes: Set[str],
+) -> List[Tuple[Dict[str, str], Optional[str]]]:
+    """Convert a chunk of depictions (worker function of `convert_depictions`)"""
+    results: List[Tuple[Dict[str, str], Optional[str]]] = []
+    for idepic in idepics:
+        try:
+            results.append((_depict(idepic, itype, otypes), None))
+        except Exception as e:
+            # RDKit raises a mix of TypeError, ValueError and Boost.Python.ArgumentError
+            results.append(({}, str(e)))
+    return results
+
+
+def convert_depictions(
+    idepics: Iterable[str],
+    itype: Literal["smiles", "inchi"] = "smiles",
+    otype: Iterable[str] = ("inchikey",),
+    n_workers: int = 1,
+    chunk_size: int = 256,
+) -> List[Tuple[Dict[str, str], Optional[str]]]:
+    """Convert a batch of chemical depictions, parsing each input only once.
+
+    Unlike `convert_depiction`, a depiction that cannot be converted does not raise
+    but is reported with its error message. With `n_workers` > 1 the batch is split
+    into chunks that are converted in a process pool; the results are returned in
+    the input order, identical to the serial conversion.
+
+    Args:
+        idepics: Input depiction strings (SMILES or InChI), all of type `itype`.
+        itype: Type of the input depictions, either "smiles" or "inchi".
+        otype: Iterable of desired output types. Any of {"smiles", "inchi", "inchikey"}.
+        n_workers: Number of worker processes. 1 (default) converts in the current process.
+        chunk_size: Number of depictions sent to a worker at once.
 
     Returns:
-        pd.DataFrame: Loaded DataFrame from the TSV file.
+        List[Tuple[Dict[str, str], Optional[str]]]: One (outputs, error) pair per input, in the same
+        order. `outputs` maps the requested output types to their values and `error` is None on
+        success; on failure `outputs` is empty and `error` describes the problem.
+
+    Raises:
+        NotImplementedError: If `itype` or any requested output type is unsupported.
+        ValueError: If `otype` is empty.
     """
-    # Case 1: file is a regular TSV
-    if file_path.endswith(".tsv"):
-        return pd.read_csv(file_path, comment="#", sep="\t", header=None)
+    otypes: Set[str] = set(otype)
+    _check_depiction_types(itype, otypes)
+    idepics = list(idepics)
+    if n_workers <= 1 or len(idepics) <= chunk_size:
+        return _convert_depictions_chunk(idepics, itype, otypes)
+    chunks = [idepics[i:i + chunk_size] for i in range(0, len(idepics), chunk_size)]
+    results: List[Tuple[Dict[str, str], Optional[str]]] = []
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for chunk_results in executor.map(
+                _convert_depictions_chunk,
+                chunks,
+                [itype] * len(chunks),
+                [otypes] * len(chunks),
+            ):
+            results.extend(chunk_results)
+    return results
 
-    # Case 2: file is a .tar.gz containing a TSV
-    elif file_path.endswith(".tar.gz"):
-        with tempfile.TemporaryDirectory() as tmpdir:
-            with tarfile.open(file_path, "r:gz") as tar:
-                # find the TSV file inside
-                tsv_members = [m for m in tar.getmembers() if m.name.endswith(".tsv")]
-                if not tsv_members:
-                    raise FileNotFoundError("No .tsv file found in tar.gz archive.")
-                member = tsv_members[0]
-                tar.extract(member, tmpdir)
-                extracted_path = os.path.join(tmpdir, member.name)
-                return pd.read_csv(extracted_path, comment="#", sep="\t", header=None)
 
-    else:
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def resource_path(name: str) -> str:
+    """Return the path of a file shipped with the package (e.g. "data/rxn_recipes.tsv.tar.gz").
+
+    Args:
+        name (str): Path relative to the metaxime package directory.
+
+    Returns:
+        str: Absolute path to the resource.
+    """
+    return os.path.join(PACKAGE_DIR, name)
+
+
+def read_compressed_tsv(
+    file_path: str,
+    chunksize: Optional[int] = None,
+    names: Optional[List[str]] = None,
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """Load a TSV file of reaction recipes, supporting plain or tar.gz formats.
+
+    The TSV member of a .tar.gz is streamed from the archive straight into the CSV
+    reader, without being extracted to disk. Relative paths that do not exist from
+    the current working directory are resolved relative to the package.
+
+    Args:
+        file_path (str): Path to the .tsv or .tar.gz file containing the TSV.
+        chunksize (Optional[int]): If set, return an iterator of DataFrames of this many rows.
+        names (Optional[List[str]]): Column names. Recommended with `chunksize`, since otherwise
+            the number of columns is inferred from the first chunk only.
+
+    Returns:
+        Union[pd.DataFrame, Iterator[pd.DataFrame]]: Loaded DataFrame from the TSV file,
+        or an iterator over its chunks.
+    """
+    if not os.path.isabs(file_path) and not os.path.exists(file_path):
+        file_path = resource_path(file_path)
+    if not file_path.endswith(".tsv") and not file_path.endswith(".tar.gz"):
         raise ValueError(f"Unsupported file type: {file_path}")
+    if chunksize:
+        return _iter_compressed_tsv(file_path, chunksize, names)
+    return next(_iter_compressed_tsv(file_path, None, names))
+
 
+def _iter_compressed_tsv(
+    file_path: str,
+    chunksize: Optional[int],
+    names: Optional[List[str]],
+) -> Iterator[pd.DataFrame]:
+    """Yield the TSV (or its chunks) of `read_compressed_tsv`, keeping the archive open while reading"""
+    import pandas as pd
 
+    read_kwargs = {"comment": "#", "sep": "\t", "header": None, "chunksize": chunksize, "names": names}
+    # Case 1: file is a regular TSV
+    if file_path.endswith(".tsv"):
+        if chunksize:
+            with pd.read_csv(file_path, **read_kwargs) as reader:
+                yield from reader
+        else:
+            yield pd.read_csv(file_path, **read_kwargs)
+        return
+    # Case 2: file is a .tar.gz containing a TSV
+    with tarfile.open(file_path, "r:gz") as tar:
+        # find the TSV file inside, ignoring the macOS metadata ("._*") members
+        tsv_members = [
+            m for m in tar.getmembers()
+            if m.isfile() and m.name.endswith(".tsv") and not os.path.basename(m.name).startswith("._")
+        ]
+        if not tsv_members:
+            raise FileNotFoundError("No .tsv file found in tar.gz archive.")
+        with tar.extractfile(tsv_members[0]) as fh:
+            if chunksize:
+                with pd.read_csv(fh, **read_kwargs) as reader:
+                    yield from reader
+            else:
+                yield pd.read_csv(fh, **read_kwargs)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Check that the lightweight entry points of MetaXime import fast.
+
+Each module is imported in a fresh interpreter with ``python -X importtime``. The
+check fails if its cumulative import time exceeds its budget, or if it pulls in
+one of the heavy dependencies that must only be loaded on first use. The
+dependencies a module cannot do without (e.g. biopathopt for the parser) are
+not counted, nor is what they import themselves.
+
+Usage:
+    python scripts/check_import_time.py [--scale 2.0]
+"""
+import argparse
+import logging
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+
+# module -> (import time budget in ms, directory added to sys.path)
+BUDGETS = {
+    "metaxime": (150, REPO_DIR),
+    "metaxime.cli": (150, REPO_DIR),
+    "metaxime.service": (150, REPO_DIR),
+    "metaxime.parser": (200, REPO_DIR),
+    "utils": (150, REPO_DIR / "webapp" / "backend"),
+}
+HEAVY_MODULES = ("rdkit", "pandas", "cobra", "networkx", "biopathopt")
+# module -> dependencies needed at import time, whose import (and what it imports) is not counted
+REQUIRED_DEPENDENCIES = {
+    "metaxime.parser": ("biopathopt",),
+}
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_time(module: str, path: Path, required=()):
+    """Import a module in a new interpreter and return its cumulative import time (ms) and the imported modules
+
+    The ``required`` top-level packages, and the modules imported under them, are left out of both.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(path), os.environ.get("PYTHONPATH")]))}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, cwd=str(path),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Cannot import {module}: {proc.stderr.strip().splitlines()[-1]}")
+    total_us = 0
+    imported = set()
+    # the lines are in post-order: the modules a module imports are the deeper lines just above it
+    stack = []  # (depth, imported modules, excluded time in us) of the subtrees not attached to a parent yet
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        depth, name, cumulative_us = len(match.group(3)), match.group(4), int(match.group(2))
+        names, excluded_us = {name}, 0
+        while stack and stack[-1][0] > depth:
+            _, child_names, child_excluded_us = stack.pop()
+            names |= child_names
+            excluded_us += child_excluded_us
+        if name.split(".")[0] in required:
+            names, excluded_us = set(), cumulative_us
+        stack.append((depth, names, excluded_us))
+        if name == module:
+            total_us = cumulative_us - excluded_us
+            imported = names
+    return total_us / 1000, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the lightweight entry points")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget (e.g. on slow CI machines)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    failed = False
+    for module, (budget, path) in BUDGETS.items():
+        elapsed, imported = import_time(module, path, REQUIRED_DEPENDENCIES.get(module, ()))
+        heavy = sorted({m.split(".")[0] for m in imported} & set(HEAVY_MODULES))
+        ok = elapsed <= budget * args.scale and not heavy
+        failed |= not ok
+        logging.info(
+            f"{'OK  ' if ok else 'FAIL'} {module}: {elapsed:.1f} ms (budget {budget * args.scale:.0f} ms)"
+            + (f", imports {', '.join(heavy)}" if heavy else "")
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
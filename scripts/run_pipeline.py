@@ -32,6 +32,12 @@ def build_cli():
     parser.add_argument("--target_comp", default="c", help="Target compartment id")
     parser.add_argument("--use_inchikey2", action="store_true", help="Use InChIKey2 fallback")
     parser.add_argument("--find_all_parentless", action="store_true", help="Do not include models with parentless heterologous molecules")
+    parser.add_argument("--stream_paths", action="store_true", help="Read and complete the RP2 paths one Path ID at a time to bound memory")
+    parser.add_argument("--max_subpaths", type=int, default=None, help="Skip the pathways with more subpaths than this")
+    parser.add_argument("--top_k_subpaths", type=int, default=None, help="Only complete the K subpaths of each pathway with the best combined rule score")
+    parser.add_argument("--subpath_time_budget", type=float, default=None, help="Stop completing the subpaths of a pathway after this many seconds")
+    parser.add_argument("--n_workers", type=int, default=1, help="Number of processes completing the Path IDs in parallel")
+    parser.add_argument("--reference_socket", default=None, help="UNIX socket of a running `metaxime serve` (defaults to METAXIME_REFERENCE_SOCKET)")
 
     return parser
 
@@ -58,17 +64,27 @@ def main():
             rp2_scope_path=str(scope_path),
             rp2_cmp_path=str(compounds_path),
             rp2_paths_path=str(paths_path),
+            stream_paths=args.stream_paths,
+            reference_socket=args.reference_socket,
+            max_subpaths=args.max_subpaths,
+            top_k_subpaths=args.top_k_subpaths,
+            subpath_time_budget=args.subpath_time_budget,
+            n_workers=args.n_workers,
+            scope_reaction_smiles=False,
         )
-        all_models = parser.return_rp2_models(compartment_id=args.source_comp)
         target_builder = ModelBuilder(str(target_model_path))
+        if args.stream_paths:
+            all_models = parser.iter_rp2_models(compartment_id=args.source_comp)
+        else:
+            all_models = parser.return_rp2_models(compartment_id=args.source_comp).items()
 
-        for path_id in all_models:
-            for sub_path_id in all_models[path_id]:
+        for path_id, path_models in all_models:
+            for sub_path_id in path_models:
                 model_id = f"rp2_{path_id}_{sub_path_id}"
                 logging.info("Processing %s", model_id)
                 try:
                     merged = merge_models(
-                        all_models[path_id][sub_path_id],
+                        path_models[sub_path_id],
                         target_builder.model,
                         source_compartment=args.source_comp,
                         target_compartment=args.target_comp,
@@ -82,7 +98,7 @@ def main():
                     logging.info("Saved merged SBML: %s", sbml_file)
 
                     # Graph JSON output
-                    G = parser.cobra_model_to_digraph(all_models[path_id][sub_path_id])
+                    G = parser.cobra_model_to_digraph(path_models[sub_path_id])
                     # find out what are the childless and parentless to 
                     tmp_G = parser.remove_dangling_reactions(G)
                     parentless_nodes = [n for n in tmp_G.nodes if tmp_G.in_degree(n) == 0]
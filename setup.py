@@ -48,10 +48,11 @@ setup(
     license="",
     packages=find_packages(exclude=["ez_setup"]),
     package_dir={},
-    package_data={},
+    package_data={"metaxime": ["data/*.tar.gz"]},
     include_package_data=True,
     zip_safe=False,
     test_suite="nose.collector",
     install_requires=require,
+    entry_points={"console_scripts": ["metaxime=metaxime.cli:main"]},
     tests_require=tests_require,
 )
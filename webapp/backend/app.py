@@ -16,7 +16,7 @@ from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
-from utils import convert_depiction
+from utils import convert_depictions
 
 # ---------------------------------------------------------------------------
 # Paths and constants
@@ -497,6 +497,9 @@ def create_job(request: JobCreateRequest) -> JobInfo:
             Full job description including its initial state.
     """
     payload: Dict[str, Any] = request.model_dump()
+    (target_conv, target_error), = convert_depictions([str(payload["target_inchi"])], itype='inchi', otype=['smiles'])
+    if target_error:
+        raise HTTPException(status_code=400, detail=f"Invalid target InChI: {target_error}")
     run_cwd: Optional[str] = payload.pop("work_dir", None)
     base_output_dir_str: Optional[str] = payload.pop("base_output_dir", None)
 
@@ -521,7 +524,7 @@ def create_job(request: JobCreateRequest) -> JobInfo:
 
     payload["model_file"] = str(payload["model_file"])
     payload["target_inchi"] = str(payload["target_inchi"])
-    payload["target_smiles"] = convert_depiction(str(payload["target_inchi"]), itype='inchi', otype=['smiles'])['smiles']
+    payload["target_smiles"] = target_conv['smiles']
     payload["job_dir"] = job_dir
     payload["nxf_work_dir"] = nxf_work_dir
     payload["output_folder"] = output_folder
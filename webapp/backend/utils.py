@@ -1,53 +1,47 @@
-from rdkit.Chem import MolFromSmiles, MolFromInchi, MolToSmiles, MolToInchi
-from rdkit.Chem.inchi import MolToInchiKey
-
 from typing import Dict, Tuple, Any, Optional, Iterable, Literal, Set, Union, List
 from typing import Callable, Dict, Any, Mapping, Optional
 from typing import Dict, Tuple, Optional
 
 import logging
 
-def convert_depiction(
-    idepic: str,
-    itype: Literal["smiles", "inchi"] = "smiles",
-    otype: Iterable[str] = ("inchikey",),
-) -> Dict[str, str]:
-    """Convert a chemical depiction to one or more other formats using RDKit.
+SUPPORTED_DEPICTIONS = {"smiles", "inchi", "inchikey"}
 
-    Args:
-        idepic: Input depiction string (SMILES or InChI).
-        itype: Type of the input depiction, either "smiles" or "inchi".
-        otype: Iterable of desired output types. Any of {"smiles", "inchi", "inchikey"}.
 
-    Returns:
-        Dict[str, str]: A mapping from requested output types to their string values.
+def _check_depiction_types(itype: str, otypes: Set[str]) -> None:
+    """Validate the input and output depiction types.
 
     Raises:
         NotImplementedError: If `itype` or any requested output type is unsupported.
-        TypeError: If the input cannot be parsed into an RDKit molecule.
-        ValueError: If `otype` is empty.
+        ValueError: If `otypes` is empty.
     """
-    logging.debug(f"input: {idepic}")
-    logging.debug(f"itype: {itype}")
-    otypes: Set[str] = set(otype)
     if not otypes:
         raise ValueError("`otype` must contain at least one output type.")
+    if itype not in ("smiles", "inchi"):
+        raise NotImplementedError(f'"{itype}" is not a valid input type (use "smiles" or "inchi").')
+    unknown = otypes - SUPPORTED_DEPICTIONS
+    if unknown:
+        raise NotImplementedError(f"Unsupported output type(s): {sorted(unknown)}. "
+                                  f"Supported: {sorted(SUPPORTED_DEPICTIONS)}")
+
+
+def _depict(idepic: str, itype: str, otypes: Set[str]) -> Dict[str, str]:
+    """Parse a depiction once and export it to all the requested output types.
+
+    Raises:
+        TypeError: If the input cannot be parsed into an RDKit molecule.
+    """
+    # RDKit is imported on the first conversion to keep the start-up of the backend fast
+    from rdkit.Chem import MolFromSmiles, MolFromInchi, MolToSmiles, MolToInchi
+    from rdkit.Chem.inchi import MolToInchiKey
     # Import
     if itype == "smiles":
         rdmol = MolFromSmiles(idepic, sanitize=True)
-    elif itype == "inchi":
-        rdmol = MolFromInchi(idepic, sanitize=True)
     else:
-        raise NotImplementedError(f'"{itype}" is not a valid input type (use "smiles" or "inchi").')
+        rdmol = MolFromInchi(idepic, sanitize=True)
     if rdmol is None:
         raise TypeError(f'Failed to parse depiction "{idepic}" of type "{itype}".')
     logging.debug("Sanitized the input molecule")
     # Export
-    supported = {"smiles", "inchi", "inchikey"}
-    unknown = otypes - supported
-    if unknown:
-        raise NotImplementedError(f"Unsupported output type(s): {sorted(unknown)}. "
-                                  f"Supported: {sorted(supported)}")
     out: Dict[str, str] = {}
     if "smiles" in otypes:
         # canonical SMILES by default
@@ -58,3 +52,66 @@ def convert_depiction(
         out["inchikey"] = MolToInchiKey(rdmol)
     logging.debug("Exported the requested output depictions")
     return out
+
+
+def convert_depiction(
+    idepic: str,
+    itype: Literal["smiles", "inchi"] = "smiles",
+    otype: Iterable[str] = ("inchikey",),
+) -> Dict[str, str]:
+    """Convert a chemical depiction to one or more other formats using RDKit.
+
+    Args:
+        idepic: Input depiction string (SMILES or InChI).
+        itype: Type of the input depiction, either "smiles" or "inchi".
+        otype: Iterable of desired output types. Any of {"smiles", "inchi", "inchikey"}.
+
+    Returns:
+        Dict[str, str]: A mapping from requested output types to their string values.
+
+    Raises:
+        NotImplementedError: If `itype` or any requested output type is unsupported.
+        TypeError: If the input cannot be parsed into an RDKit molecule.
+        ValueError: If `otype` is empty.
+    """
+    logging.debug(f"input: {idepic}")
+    logging.debug(f"itype: {itype}")
+    otypes: Set[str] = set(otype)
+    _check_depiction_types(itype, otypes)
+    return _depict(idepic, itype, otypes)
+
+
+def convert_depictions(
+    idepics: Iterable[str],
+    itype: Literal["smiles", "inchi"] = "smiles",
+    otype: Iterable[str] = ("inchikey",),
+) -> List[Tuple[Dict[str, str], Optional[str]]]:
+    """Convert a batch of chemical depictions, parsing each input only once.
+
+    Unlike `convert_depiction`, a depiction that cannot be converted does not raise
+    but is reported with its error message.
+
+    Args:
+        idepics: Input depiction strings (SMILES or InChI), all of type `itype`.
+        itype: Type of the input depictions, either "smiles" or "inchi".
+        otype: Iterable of desired output types. Any of {"smiles", "inchi", "inchikey"}.
+
+    Returns:
+        List[Tuple[Dict[str, str], Optional[str]]]: One (outputs, error) pair per input, in the same
+        order. `outputs` maps the requested output types to their values and `error` is None on
+        success; on failure `outputs` is empty and `error` describes the problem.
+
+    Raises:
+        NotImplementedError: If `itype` or any requested output type is unsupported.
+        ValueError: If `otype` is empty.
+    """
+    otypes: Set[str] = set(otype)
+    _check_depiction_types(itype, otypes)
+    results: List[Tuple[Dict[str, str], Optional[str]]] = []
+    for idepic in idepics:
+        try:
+            results.append((_depict(idepic, itype, otypes), None))
+        except Exception as e:
+            # RDKit raises a mix of TypeError, ValueError and Boost.Python.ArgumentError
+            results.append(({}, str(e)))
+    return results